@@ -1,7 +1,12 @@
 """
 Handling the AI moves.
 """
+import multiprocessing
 import random
+import struct
+import time
+from multiprocessing import shared_memory
+import ChessEngine
 
 piece_score = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
 
@@ -50,53 +55,772 @@ pawn_scores = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
                [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
                [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
 
-piece_position_scores = {"wN": knight_scores,
-                         "bN": knight_scores[::-1],
-                         "wB": bishop_scores,
-                         "bB": bishop_scores[::-1],
-                         "wQ": queen_scores,
-                         "bQ": queen_scores[::-1],
-                         "wR": rook_scores,
-                         "bR": rook_scores[::-1],
-                         "wP": pawn_scores,
-                         "bP": pawn_scores[::-1]}
-
-CHECKMATE = 1000
+# endgame variants, kings walk to the centre and pawns are worth more the closer they are to promotion
+king_endgame_scores = [[0.0, 0.1, 0.2, 0.25, 0.25, 0.2, 0.1, 0.0],
+                       [0.1, 0.3, 0.4, 0.45, 0.45, 0.4, 0.3, 0.1],
+                       [0.2, 0.4, 0.55, 0.6, 0.6, 0.55, 0.4, 0.2],
+                       [0.25, 0.45, 0.6, 0.7, 0.7, 0.6, 0.45, 0.25],
+                       [0.25, 0.45, 0.6, 0.7, 0.7, 0.6, 0.45, 0.25],
+                       [0.2, 0.4, 0.55, 0.6, 0.6, 0.55, 0.4, 0.2],
+                       [0.1, 0.3, 0.4, 0.45, 0.45, 0.4, 0.3, 0.1],
+                       [0.0, 0.1, 0.2, 0.25, 0.25, 0.2, 0.1, 0.0]]
+
+pawn_endgame_scores = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
+                       [1.2, 1.2, 1.2, 1.2, 1.2, 1.2, 1.2, 1.2],
+                       [0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
+                       [0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+                       [0.3, 0.3, 0.3, 0.3, 0.3, 0.3, 0.3, 0.3],
+                       [0.15, 0.15, 0.15, 0.15, 0.15, 0.15, 0.15, 0.15],
+                       [0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1],
+                       [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
+
+# integer piece codes addressing the flat evaluation tables, 0 is an empty square
+pieces = ["wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK"]
+piece_codes = {"--": 0}
+for code, piece in enumerate(pieces):
+    piece_codes[piece] = code + 1
+
+midgame_position_scores = {"N": knight_scores, "B": bishop_scores, "R": rook_scores, "Q": queen_scores,
+                           "P": pawn_scores, "K": None}
+endgame_position_scores = {"N": knight_scores, "B": bishop_scores, "R": rook_scores, "Q": queen_scores,
+                           "P": pawn_endgame_scores, "K": king_endgame_scores}
+
+
+def compileSquareValues(position_scores):
+    """
+    Compile 8x8 piece-square tables into flat tables indexed by [piece code][square], square = row * 8 + col.
+    Material is folded in, black tables are mirrored and negated, so a position is scored by plain addition.
+    """
+    square_values = [[0] * 64]
+    for piece in pieces:
+        scores = position_scores[piece[1]]
+        values = []
+        for square in range(64):
+            row, col = divmod(square, 8)
+            piece_position_score = 0
+            if scores is not None:
+                piece_position_score = scores[row if piece[0] == "w" else 7 - row][col]
+            value = piece_score[piece[1]] + piece_position_score
+            values.append(value if piece[0] == "w" else -value)
+        square_values.append(values)
+    return square_values
+
+
+midgame_square_values = compileSquareValues(midgame_position_scores)
+endgame_square_values = compileSquareValues(endgame_position_scores)
+
+# game phase, TOTAL_PHASE with all minor and major pieces on the board, 0 with only kings and pawns
+phase_weights = [0] * len(piece_codes)
+for piece in pieces:
+    phase_weights[piece_codes[piece]] = {"N": 1, "B": 1, "R": 2, "Q": 4}.get(piece[1], 0)
+TOTAL_PHASE = 24
+
+# evaluation terms on top of material and piece-square tables, (midgame, endgame) in pawns
+mobility_bonus = {"N": (0.04, 0.04), "B": (0.05, 0.05), "R": (0.02, 0.04), "Q": (0.01, 0.02)}
+bishop_pair_bonus = (0.3, 0.5)
+doubled_pawn_penalty = (0.1, 0.2)
+isolated_pawn_penalty = (0.15, 0.2)
+passed_pawn_bonus = [(0.0, 0.0), (0.05, 0.1), (0.05, 0.15), (0.1, 0.25), (0.2, 0.45), (0.35, 0.7), (0.6, 1.0),
+                     (0.0, 0.0)]  # indexed by the pawn's rank counted from its own side, 0 to 7
+king_shield_bonus = 0.1  # midgame only, per own pawn in front of a castled king
+king_open_file_penalty = 0.25  # midgame only, no own pawn on the king's file
+
+knight_directions = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+slider_directions = {"B": ((-1, -1), (-1, 1), (1, 1), (1, -1)),
+                     "R": ((-1, 0), (0, -1), (1, 0), (0, 1)),
+                     "Q": ((-1, -1), (-1, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (1, 0), (0, 1))}
+
+# pawn hash table - pawn structure changes rarely between nodes, so its score is cached by the pawn-only key
+PAWN_HASH_SIZE = 1 << 14
+pawn_hash_table = [None] * PAWN_HASH_SIZE
+
+# evaluation cache - direct-mapped table of (position key, static score) consulted before a full evaluation
+EVAL_CACHE_SIZE = 1 << 16
+eval_cache = [None] * EVAL_CACHE_SIZE
+
+# counters of the last search
+search_stats = {"nodes": 0, "eval_cache_hits": 0, "eval_cache_misses": 0, "move_cache_hits": 0, "move_cache_misses": 0}
+
+RICH_EVALUATION = True  # False scores material and midgame piece-square tables only, call clearEvalCache after changing
+CHECKMATE = 1000  # mate scores are CHECKMATE - plies to mate, so a quicker mate scores higher
 STALEMATE = 0
+MAX_PLY = 100  # scores further than this from CHECKMATE are not mate scores
 DEPTH = 3
+MAX_DEPTH = 64  # deepest iteration of an unlimited search
+CHECK_LIMITS_EVERY = 256  # nodes between checks of the stop flag, deadline and node limit
+HASH_SIZE_MB = 16
+TIME_LIMIT = 10  # seconds the GUI's move finder may think before it plays its best move so far
+
+# transposition table bounds
+EXACT = 0
+LOWER_BOUND = 1  # the score is at least this, the search failed high
+UPPER_BOUND = 2  # the score is at most this, the search failed low
+
+# limits of the running search, set by searchPosition
+search_limits = {"deadline": None, "nodes": None, "stop_event": None}
+stop_search = False
+# info_callback of the running search, the best root move it was last told about and the move cache whose
+# counters go into search_stats when the search ends
+search_report = {"callback": None, "start_time": 0.0, "best_move": None, "move_cache": None}
+
+
+class TranspositionTable:
+    """
+    Direct-mapped table of search results keyed by the Zobrist key of the position.
+    Each entry is a tuple (key, depth, score, bound, best move id).
+    """
+    ENTRY_BYTES = 128  # rough size of one Python tuple entry, used to turn megabytes into entries
+
+    def __init__(self, size_mb=HASH_SIZE_MB):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        """
+        Reallocate the table to the largest power of two number of entries that fits in size_mb, this clears it.
+        """
+        size = 1
+        while size * 2 * self.ENTRY_BYTES <= size_mb * 1024 * 1024:
+            size *= 2
+        self.size = size
+        self.entries = [None] * size
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+    def probe(self, key):
+        entry = self.entries[key & (self.size - 1)]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, move_id):
+        self.entries[key & (self.size - 1)] = (key, depth, score, bound, move_id)
+
+
+class SharedTranspositionTable:
+    """
+    Transposition table in shared memory that every search process reads and writes at once, without locks.
+    An entry is three 64-bit words: a check word (the key XORed with the other two), the bits of the score and
+    depth | bound << 8 | best move id << 16 with a valid bit on top. An entry torn by two processes writing it
+    at the same time no longer XORs back to its key, so probe treats it as a miss.
+    The process that creates the table owns the memory, the others attach to it by name.
+    Probe and store work like TranspositionTable's, so either can be ChessAI.transposition_table.
+    """
+    ENTRY = struct.Struct("<QQQ")
+    ENTRY_BYTES = ENTRY.size
+    SCORE = struct.Struct("<d")
+    SCORE_BITS = struct.Struct("<Q")
+    VALID = 1 << 63
+
+    def __init__(self, size_mb=HASH_SIZE_MB, name=None):
+        self.memory = None
+        self.owner = False
+        if name is None:
+            self.resize(size_mb)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.size = self.entryCount(self.memory.size)
+
+    def entryCount(self, size_bytes):
+        size = 1
+        while size * 2 * self.ENTRY_BYTES <= size_bytes:
+            size *= 2
+        return size
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def resize(self, size_mb):
+        """
+        Replace the table with a new shared block of the largest power of two number of entries that fits in size_mb,
+        processes attached to the old block keep using it.
+        """
+        self.close()
+        self.size = self.entryCount(size_mb * 1024 * 1024)
+        self.memory = shared_memory.SharedMemory(create=True, size=self.size * self.ENTRY_BYTES)
+        self.owner = True
+        self.clear()
+
+    def clear(self):
+        self.memory.buf[:self.size * self.ENTRY_BYTES] = bytes(self.size * self.ENTRY_BYTES)
+
+    def close(self):
+        """
+        Detach from the shared block, the owner also frees it.
+        """
+        if self.memory is None:
+            return
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+        self.memory = None
+
+    def probe(self, key):
+        check, score_bits, info = self.ENTRY.unpack_from(self.memory.buf, (key & (self.size - 1)) * self.ENTRY_BYTES)
+        if check ^ score_bits ^ info != key or not info & self.VALID:
+            return None
+        score = self.SCORE.unpack(self.SCORE_BITS.pack(score_bits))[0]
+        return key, info & 0xFF, score, info >> 8 & 0xFF, info >> 16 & 0xFFFF
+
+    def store(self, key, depth, score, bound, move_id):
+        score_bits = self.SCORE_BITS.unpack(self.SCORE.pack(score))[0]
+        info = self.VALID | move_id << 16 | bound << 8 | depth
+        self.ENTRY.pack_into(self.memory.buf, (key & (self.size - 1)) * self.ENTRY_BYTES, key ^ score_bits ^ info,
+                             score_bits, info)
+
+
+transposition_table = TranspositionTable()
+move_cache = ChessEngine.MoveCache()  # legal moves of searched positions, later iterations and searches reuse them
+analysis_cache = None  # optional ChessAnalysisCache.AnalysisCache of finished searches, kept between runs
+
+
+def attachSharedTable(name):
+    """
+    Make this process search with the SharedTranspositionTable of the given name, used as a pool initializer.
+    """
+    global transposition_table
+    transposition_table = SharedTranspositionTable(name=name)
 
 
 def findBestMove(game_state, valid_moves, return_queue):
-    global next_move
-    next_move = None
+    """
+    Search to DEPTH and put the best move on return_queue, runs in the GUI's move finder process.
+    """
     random.shuffle(valid_moves)
-    findMoveNegaMaxAlphaBeta(game_state, valid_moves, DEPTH, -CHECKMATE, CHECKMATE,
-                             1 if game_state.white_to_move else -1)
-    return_queue.put(next_move)
+    best_move, score = searchPosition(game_state, valid_moves, max_depth=DEPTH)
+    return_queue.put(best_move)
+
+
+def moveFinderWorker(request_queue, return_queue, stop_event):
+    """
+    Long-lived move finder process for the GUI.
+    Takes (request id, packed position) requests from request_queue and puts (request id, best move in UCI notation)
+    on return_queue, None stops it. Positions travel as GameState.packPosition bytes instead of pickled GameStates.
+    Setting stop_event makes the running search return its best move so far instead of being killed,
+    so the process and its transposition table are reused for the next request. The event is cleared when
+    the next request starts, so the caller never has to wait for the stopped search.
+    """
+    game_state = ChessEngine.GameState()
+    while True:
+        request = request_queue.get()
+        if request is None:
+            return
+        request_id, packed_position = request
+        stop_event.clear()
+        game_state.loadPackedPosition(packed_position)
+        valid_moves = game_state.getValidMoves()
+        random.shuffle(valid_moves)
+        best_move, score = searchPosition(game_state, valid_moves, max_depth=DEPTH, time_limit=TIME_LIMIT,
+                                          stop_event=stop_event)
+        return_queue.put((request_id, best_move.getUciNotation() if best_move is not None else None))
+
+
+def helperWorker(table_name, request_queue, done_queue, stop_event):
+    """
+    Helper process of a ParallelSearch.
+    Takes (packed position, max depth, helper number) requests from request_queue and searches them with the shared
+    table until the search ends or stop_event is set, then puts the helper number on done_queue, None stops it.
+    Odd helpers go one ply deeper and every helper orders the root moves its own way, so they work ahead of
+    the main search and on different moves instead of repeating it.
+    """
+    attachSharedTable(table_name)
+    game_state = ChessEngine.GameState()
+    while True:
+        request = request_queue.get()
+        if request is None:
+            return
+        packed_position, max_depth, helper = request
+        game_state.loadPackedPosition(packed_position)
+        valid_moves = game_state.getValidMoves()
+        random.Random(helper).shuffle(valid_moves)
+        searchPosition(game_state, valid_moves, max_depth=max_depth + helper % 2, stop_event=stop_event)
+        done_queue.put(helper)
+
+
+class ParallelSearch:
+    """
+    Lazy SMP: threads - 1 helper processes search the same position as the calling process, all of them with one
+    SharedTranspositionTable. Only the caller's search gives the answer, the helpers fill the table with results
+    it then finds instead of searching them itself. The helpers are spawned once and live until close().
+    """
+
+    def __init__(self, threads, size_mb=HASH_SIZE_MB):
+        self.table = SharedTranspositionTable(size_mb)
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        self.done_queue = context.Queue()
+        self.request_queues = []
+        self.helpers = []
+        for _ in range(threads - 1):
+            request_queue = context.Queue()
+            helper = context.Process(target=helperWorker,
+                                     args=(self.table.name, request_queue, self.done_queue, self.stop_event),
+                                     daemon=True)
+            helper.start()
+            self.request_queues.append(request_queue)
+            self.helpers.append(helper)
+
+    def search(self, game_state, valid_moves=None, max_depth=MAX_DEPTH, time_limit=None, max_nodes=None,
+               stop_event=None, info_callback=None):
+        """
+        searchPosition with the helpers searching alongside, returns (best move, score for the side to move).
+        The limits apply to the calling process's search, the helpers stop when it returns.
+        """
+        global transposition_table
+        previous_table = transposition_table
+        transposition_table = self.table
+        self.stop_event.clear()
+        packed_position = game_state.packPosition()
+        for helper, request_queue in enumerate(self.request_queues, 1):
+            request_queue.put((packed_position, max_depth, helper))
+        try:
+            return searchPosition(game_state, valid_moves, max_depth, time_limit, max_nodes, stop_event,
+                                  info_callback)
+        finally:
+            self.stop_event.set()
+            for _ in self.request_queues:
+                self.done_queue.get()  # every helper has stopped before the next search starts
+            transposition_table = previous_table
+
+    def clear(self):
+        self.table.clear()
+
+    def close(self):
+        for request_queue in self.request_queues:
+            request_queue.put(None)
+        for helper in self.helpers:
+            helper.join()
+        self.table.close()
+
+
+def searchPosition(game_state, valid_moves=None, max_depth=MAX_DEPTH, time_limit=None, max_nodes=None,
+                   stop_event=None, info_callback=None):
+    """
+    Iterative deepening search, returns (best move, score for the side to move).
+    The search stops after max_depth, when time_limit seconds have passed, after max_nodes nodes
+    or when stop_event (a threading or multiprocessing Event) is set, whichever comes first.
+    A stopped search returns the best move of the last iteration, or of the unfinished one if it found a better move.
+    info_callback is called with a dict of type, depth, score, nodes, time, nps and pv: type "iteration" after
+    every finished iteration and "best_move" when the unfinished one finds a new best root move, with pv that move.
+    A callback returning True stops the search, so a caller can stop once the result is good enough.
+    With an analysis_cache installed, a stored result at least as deep as max_depth is returned without searching,
+    as is one of at least the cache's min_depth for a search limited by time or nodes.
+    A game_state without a move_cache uses the shared one during the search, so positions expanded by an earlier
+    iteration do not have their moves generated again.
+    """
+    previous_cache = game_state.move_cache
+    if previous_cache is None:
+        game_state.move_cache = move_cache
+    try:
+        return iterativeDeepening(game_state, valid_moves, max_depth, time_limit, max_nodes, stop_event,
+                                  info_callback)
+    finally:
+        game_state.move_cache = previous_cache
 
 
-def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta, turn_multiplier):
+def iterativeDeepening(game_state, valid_moves, max_depth, time_limit, max_nodes, stop_event, info_callback):
+    """
+    The search of searchPosition.
+    """
     global next_move
+    start_time = startSearch(time_limit, max_nodes, stop_event, info_callback, game_state.move_cache)
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    if len(valid_moves) == 0:
+        endSearch()
+        return None, -CHECKMATE if game_state.in_check else STALEMATE
+    if analysis_cache is not None:
+        cached = probeAnalysisCache(game_state, valid_moves, max_depth, time_limit is not None or max_nodes is not None)
+        if cached is not None:
+            depth, best_score, best_move = cached
+            reportSearchInfo("iteration", depth, best_score, [best_move])
+            endSearch()
+            return best_move, best_score
+    turn_multiplier = 1 if game_state.white_to_move else -1
+    best_move = None
+    best_score = 0
+    completed_depth = 0
+    completed_move = None  # best move of the last finished iteration, stored with its depth and score
+    for depth in range(1, min(max_depth, MAX_DEPTH) + 1):
+        next_move = None
+        score = findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, 0, -CHECKMATE, CHECKMATE, turn_multiplier)
+        if stop_search:
+            if next_move is not None and best_move is not None and next_move != best_move:
+                # a root move searched in full beat the previous best, which is always searched first
+                best_move = next_move
+            elif best_move is None:
+                best_move = next_move
+            break
+        best_move = next_move
+        best_score = score
+        completed_depth = depth
+        completed_move = best_move
+        search_report["best_move"] = best_move
+        if info_callback is not None:
+            reportSearchInfo("iteration", depth, score, getPrincipalVariation(game_state, depth))
+            if stop_search:
+                break  # the caller is content with this iteration
+        elapsed = time.time() - start_time
+        if isMateScore(score) and CHECKMATE - abs(score) <= depth:
+            break  # the shortest mate has been found
+        if time_limit is not None and elapsed > time_limit / 2:
+            break  # the next iteration would most likely not finish in time
+    if best_move is None:
+        best_move = valid_moves[0]
+    elif analysis_cache is not None and completed_depth > 0:
+        analysis_cache.store(game_state.zobrist_key, completed_depth, best_score, completed_move.moveID)
+    endSearch()
+    return best_move, best_score
+
+
+def startSearch(time_limit, max_nodes, stop_event, info_callback=None, cache=None):
+    """
+    Reset the node count and the counters of the move cache and set the limits checked by checkSearchLimits,
+    returns the start time.
+    """
+    global stop_search
+    resetSearchStats()
+    start_time = time.time()
+    search_limits["deadline"] = start_time + time_limit if time_limit is not None else None
+    search_limits["nodes"] = max_nodes
+    search_limits["stop_event"] = stop_event
+    search_report["callback"] = info_callback
+    search_report["start_time"] = start_time
+    search_report["best_move"] = None
+    search_report["move_cache"] = cache
+    if cache is not None:
+        cache.hits = 0
+        cache.misses = 0
+    stop_search = False
+    return start_time
+
+
+def endSearch():
+    cache = search_report["move_cache"]
+    if cache is not None:
+        search_stats["move_cache_hits"] = cache.hits
+        search_stats["move_cache_misses"] = cache.misses
+    search_limits["stop_event"] = None
+    search_report["callback"] = None
+    search_report["move_cache"] = None
+
+
+def reportSearchInfo(info_type, depth, score, pv, lines=None):
+    """
+    Call the running search's info_callback, if any, and stop the search if it returns True.
+    """
+    global stop_search
+    callback = search_report["callback"]
+    if callback is None:
+        return
+    elapsed = time.time() - search_report["start_time"]
+    info = {"type": info_type, "depth": depth, "score": score, "nodes": search_stats["nodes"], "time": elapsed,
+            "nps": int(search_stats["nodes"] / elapsed) if elapsed > 0 else 0, "pv": pv}
+    if lines is not None:
+        info["lines"] = lines
+    if callback(info) is True:
+        stop_search = True
+
+
+async def analyse(game_state, num_pv=1, max_depth=MAX_DEPTH, time_limit=None, max_nodes=None):
+    """
+    Async iterator over a search run on a worker thread, for front ends that show the analysis as it goes.
+    Yields the info dicts of searchPosition (searchMultiPV for num_pv > 1) as they are reported, then
+    {"type": "done", "move": best move, "score": score} with "lines" added for num_pv > 1.
+    The search is stopped when the iterator is closed. Leaving the loop early does not close it by itself, so
+    a caller that may break out should iterate under contextlib.aclosing or await the iterator's aclose():
+        async with contextlib.aclosing(ChessAI.analyse(game_state, time_limit=5)) as infos:
+            async for info in infos:
+                if info["depth"] >= 6:
+                    break
+    game_state belongs to the search until the iterator is done, and as with searchPosition only one search
+    can run in a process at a time.
+    """
+    import asyncio
+    import threading
+    loop = asyncio.get_running_loop()
+    infos = asyncio.Queue()
+    stop_event = threading.Event()
+
+    def report(info):
+        loop.call_soon_threadsafe(infos.put_nowait, info)
+
+    def run():
+        try:
+            if num_pv > 1:
+                lines = searchMultiPV(game_state, num_pv, max_depth=max_depth, time_limit=time_limit,
+                                      max_nodes=max_nodes, stop_event=stop_event, info_callback=report)
+                if not lines:
+                    return {"type": "done", "move": None, "score": -CHECKMATE if game_state.in_check else STALEMATE,
+                            "lines": lines}
+                return {"type": "done", "move": lines[0][0], "score": lines[0][1], "lines": lines}
+            best_move, score = searchPosition(game_state, max_depth=max_depth, time_limit=time_limit,
+                                              max_nodes=max_nodes, stop_event=stop_event, info_callback=report)
+            return {"type": "done", "move": best_move, "score": score}
+        finally:
+            report(None)
+
+    search = loop.run_in_executor(None, run)
+    try:
+        while True:
+            info = await infos.get()
+            if info is None:
+                break
+            yield info
+    finally:
+        stop_event.set()
+        result = await search
+    yield result
+
+
+def searchMultiPV(game_state, num_pv, valid_moves=None, max_depth=MAX_DEPTH, time_limit=None, max_nodes=None,
+                  stop_event=None, info_callback=None):
+    """
+    Iterative deepening search for the num_pv best moves, returns [(move, score, pv)] best first.
+    Every iteration searches the root moves once, each against the score of the num_pv-th best line found so far,
+    so the best lines get exact scores while the other moves fail low cheaply. The root moves keep the order
+    of the previous iteration and the transposition table is shared with the ordinary search.
+    The limits are the ones of searchPosition, a stopped search returns the lines of the last finished iteration.
+    info_callback gets the dicts of searchPosition for the best line, "iteration" ones with "lines" added,
+    [(move, score, pv)] best first, and can stop the search the same way.
+    """
+    previous_cache = game_state.move_cache
+    if previous_cache is None:
+        game_state.move_cache = move_cache
+    try:
+        return iterativeDeepeningMultiPV(game_state, num_pv, valid_moves, max_depth, time_limit, max_nodes,
+                                         stop_event, info_callback)
+    finally:
+        game_state.move_cache = previous_cache
+
+
+def iterativeDeepeningMultiPV(game_state, num_pv, valid_moves, max_depth, time_limit, max_nodes, stop_event,
+                              info_callback):
+    """
+    The search of searchMultiPV.
+    """
+    start_time = startSearch(time_limit, max_nodes, stop_event, info_callback, game_state.move_cache)
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    if len(valid_moves) == 0:
+        endSearch()
+        return []
+    num_pv = max(1, min(num_pv, len(valid_moves)))
+    turn_multiplier = 1 if game_state.white_to_move else -1
+    root_moves = list(valid_moves)
+    entry = transposition_table.probe(game_state.zobrist_key)
+    if entry is not None:
+        for i in range(len(root_moves)):
+            if root_moves[i].moveID == entry[4]:
+                root_moves.insert(0, root_moves.pop(i))
+                break
+    lines = []
+    for depth in range(1, min(max_depth, MAX_DEPTH) + 1):
+        best = searchRootMultiPV(game_state, root_moves, depth, num_pv, turn_multiplier)
+        if stop_search:
+            break
+        # the best lines first, the other moves in the order they had
+        best_moves = [move for score, move in best]
+        root_moves = best_moves + [move for move in root_moves if move not in best_moves]
+        transposition_table.store(game_state.zobrist_key, depth, scoreToTable(best[0][0], 0), EXACT,
+                                  best[0][1].moveID)
+        lines = []
+        for score, move in best:
+            game_state.makeMove(move)
+            lines.append((move, score, [move] + getPrincipalVariation(game_state, depth - 1)))
+            game_state.undoMove()
+        game_state.getValidMoves()  # restore the flags of the root position
+        search_report["best_move"] = lines[0][0]
+        if info_callback is not None:
+            reportSearchInfo("iteration", depth, lines[0][1], lines[0][2], lines)
+            if stop_search:
+                break
+        elapsed = time.time() - start_time
+        if all(isMateScore(score) and CHECKMATE - abs(score) <= depth for move, score, pv in lines):
+            break  # every line ends in a mate already
+        if time_limit is not None and elapsed > time_limit / 2:
+            break
+    if not lines:
+        lines = [(root_moves[0], 0, [root_moves[0]])]
+    endSearch()
+    return lines
+
+
+def searchRootMultiPV(game_state, root_moves, depth, num_pv, turn_multiplier):
+    """
+    One multi-PV iteration, returns [(score, move)] of the num_pv best root moves, best first.
+    """
+    search_stats["nodes"] += 1
+    best = []
+    for move in root_moves:
+        alpha = best[-1][0] if len(best) == num_pv else -CHECKMATE
+        game_state.makeMove(move)
+        next_moves = game_state.getValidMoves()
+        score = -findMoveNegaMaxAlphaBeta(game_state, next_moves, depth - 1, 1, -CHECKMATE, -alpha, -turn_multiplier)
+        game_state.undoMove()
+        if stop_search:
+            break
+        if len(best) < num_pv or score > alpha:
+            position = len(best)
+            while position > 0 and best[position - 1][0] < score:
+                position -= 1
+            best.insert(position, (score, move))
+            del best[num_pv:]
+            if position == 0 and search_report["callback"] is not None and move != search_report["best_move"]:
+                search_report["best_move"] = move
+                reportSearchInfo("best_move", depth, score, [move])
+    return best
+
+
+def probeAnalysisCache(game_state, valid_moves, max_depth, limited):
+    """
+    (depth, score, move) from the analysis cache if it is deep enough to stand in for the search, else None.
+    """
+    entry = analysis_cache.probe(game_state.zobrist_key)
+    if entry is None:
+        return None
+    depth, score, move_id = entry
+    if depth < min(max_depth, MAX_DEPTH) and not (limited and depth >= analysis_cache.min_depth):
+        return None
+    for move in valid_moves:
+        if move.moveID == move_id:
+            return depth, score, move
+    return None  # a key collision
+
+
+def checkSearchLimits():
+    """
+    Set stop_search if the stop flag is set, the deadline has passed or the node limit is reached.
+    """
+    global stop_search
+    stop_event = search_limits["stop_event"]
+    if stop_event is not None and stop_event.is_set():
+        stop_search = True
+    elif search_limits["deadline"] is not None and time.time() >= search_limits["deadline"]:
+        stop_search = True
+    elif search_limits["nodes"] is not None and search_stats["nodes"] >= search_limits["nodes"]:
+        stop_search = True
+
+
+def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, ply, alpha, beta, turn_multiplier):
+    """
+    Negamax with alpha-beta pruning, returns the score for the side to move.
+    valid_moves are the legal moves in game_state, an empty list means checkmate or stalemate.
+    """
+    global next_move
+    search_stats["nodes"] += 1
+    if search_stats["nodes"] % CHECK_LIMITS_EVERY == 0:
+        checkSearchLimits()
+    if stop_search:
+        return 0
+    if len(valid_moves) == 0:
+        # in_check was set by the getValidMoves call that produced valid_moves
+        return -(CHECKMATE - ply) if game_state.in_check else STALEMATE
+    if ply > 0:
+        # mate distance pruning - no line from here can beat a mate already found closer to the root
+        alpha = max(alpha, -(CHECKMATE - ply))
+        beta = min(beta, CHECKMATE - ply - 1)
+        if alpha >= beta:
+            return alpha
     if depth == 0:
         return turn_multiplier * scoreBoard(game_state)
-    # move ordering - implement later //TODO
+
+    key = game_state.zobrist_key
+    entry = transposition_table.probe(key)
+    if entry is not None:
+        if ply > 0 and entry[1] >= depth:
+            score = scoreFromTable(entry[2], ply)
+            bound = entry[3]
+            if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or (bound == UPPER_BOUND and score <= alpha):
+                return score
+        # move ordering - search the best move from an earlier search first
+        for i in range(len(valid_moves)):
+            if valid_moves[i].moveID == entry[4]:
+                valid_moves = [valid_moves[i]] + valid_moves[:i] + valid_moves[i + 1:]
+                break
+
+    original_alpha = alpha
     max_score = -CHECKMATE
+    best_move = None
     for move in valid_moves:
         game_state.makeMove(move)
         next_moves = game_state.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(game_state, next_moves, depth - 1, -beta, -alpha, -turn_multiplier)
+        score = -findMoveNegaMaxAlphaBeta(game_state, next_moves, depth - 1, ply + 1, -beta, -alpha,
+                                          -turn_multiplier)
+        game_state.undoMove()
+        if stop_search:
+            return 0  # the score of an unfinished subtree means nothing
         if score > max_score:
             max_score = score
-            if depth == DEPTH:
+            best_move = move
+            if ply == 0:
                 next_move = move
-        game_state.undoMove()
+                if search_report["callback"] is not None and move != search_report["best_move"]:
+                    search_report["best_move"] = move
+                    reportSearchInfo("best_move", depth, score, [move])
         if max_score > alpha:
             alpha = max_score
         if alpha >= beta:
             break
+
+    if max_score <= original_alpha:
+        bound = UPPER_BOUND
+    elif max_score >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transposition_table.store(key, depth, scoreToTable(max_score, ply), bound, best_move.moveID)
     return max_score
 
 
+def scoreToTable(score, ply):
+    """
+    Mate scores are stored as distance from the stored position rather than from the root.
+    """
+    if score > CHECKMATE - MAX_PLY:
+        return score + ply
+    if score < -(CHECKMATE - MAX_PLY):
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score > CHECKMATE - MAX_PLY:
+        return score - ply
+    if score < -(CHECKMATE - MAX_PLY):
+        return score + ply
+    return score
+
+
+def getPrincipalVariation(game_state, max_length):
+    """
+    Follow the best moves stored in the transposition table from the current position.
+    """
+    pv = []
+    for _ in range(max_length):
+        entry = transposition_table.probe(game_state.zobrist_key)
+        if entry is None:
+            break
+        move = None
+        for valid_move in game_state.getValidMoves():
+            if valid_move.moveID == entry[4]:
+                move = valid_move
+                break
+        if move is None:
+            break
+        pv.append(move)
+        game_state.makeMove(move)
+    for _ in pv:
+        game_state.undoMove()
+    game_state.getValidMoves()  # restore the checkmate, stalemate and in_check flags of the position
+    return pv
+
+
+def isMateScore(score):
+    return abs(score) > CHECKMATE - MAX_PLY
+
+
 def scoreBoard(game_state):
     """
     Score the board. A positive score is good for white, a negative score is good for black.
@@ -108,22 +832,213 @@ def scoreBoard(game_state):
             return CHECKMATE  # white wins
     elif game_state.stalemate:
         return STALEMATE
+    key = game_state.zobrist_key
+    index = key & (EVAL_CACHE_SIZE - 1)
+    entry = eval_cache[index]
+    if entry is not None and entry[0] == key:
+        search_stats["eval_cache_hits"] += 1
+        return entry[1]
+    search_stats["eval_cache_misses"] += 1
+    if RICH_EVALUATION:
+        score = scorePosition(game_state)
+    else:
+        score = scoreMaterial(game_state)
+    eval_cache[index] = (key, score)
+    return score
+
+
+def resetSearchStats():
+    for name in search_stats:
+        search_stats[name] = 0
+
+
+def clearEvalCache():
+    """
+    Empty the evaluation and pawn hash tables, needed when the evaluation terms change.
+    """
+    for i in range(EVAL_CACHE_SIZE):
+        eval_cache[i] = None
+    for i in range(PAWN_HASH_SIZE):
+        pawn_hash_table[i] = None
+
+
+def scoreMaterial(game_state):
+    """
+    Material and midgame piece-square score of the board, ignoring checkmate and stalemate.
+    """
     score = 0
-    for row in range(len(game_state.board)):
-        for col in range(len(game_state.board[row])):
-            piece = game_state.board[row][col]
+    square = 0
+    for row in game_state.board:
+        for piece in row:
             if piece != "--":
-                piece_position_score = 0
-                if piece[1] != "K":
-                    piece_position_score = piece_position_scores[piece][row][col]
-                if piece[0] == "w":
-                    score += piece_score[piece[1]] + piece_position_score
-                if piece[0] == "b":
-                    score -= piece_score[piece[1]] + piece_position_score
+                score += midgame_square_values[piece_codes[piece]][square]
+            square += 1
+    return score
+
 
+def scorePosition(game_state):
+    """
+    Tapered evaluation of the board, ignoring checkmate and stalemate.
+    Midgame and endgame scores are summed separately and interpolated by the game phase,
+    on top of material and piece-square tables it scores mobility, bishop pair, king safety and pawn structure.
+    """
+    board = game_state.board
+    midgame = endgame = 0
+    phase = 0
+    white_bishops = black_bishops = 0
+    square = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece != "--":
+                code = piece_codes[piece]
+                midgame += midgame_square_values[code][square]
+                endgame += endgame_square_values[code][square]
+                phase += phase_weights[code]
+                piece_type = piece[1]
+                if piece_type != "P" and piece_type != "K":
+                    mobility = pieceMobility(board, row, col, piece)
+                    bonus = mobility_bonus[piece_type]
+                    if piece[0] == "w":
+                        midgame += bonus[0] * mobility
+                        endgame += bonus[1] * mobility
+                        if piece_type == "B":
+                            white_bishops += 1
+                    else:
+                        midgame -= bonus[0] * mobility
+                        endgame -= bonus[1] * mobility
+                        if piece_type == "B":
+                            black_bishops += 1
+            square += 1
+
+    if white_bishops >= 2:
+        midgame += bishop_pair_bonus[0]
+        endgame += bishop_pair_bonus[1]
+    if black_bishops >= 2:
+        midgame -= bishop_pair_bonus[0]
+        endgame -= bishop_pair_bonus[1]
+
+    pawns_midgame, pawns_endgame = probePawnStructure(board, game_state.pawn_key)
+    midgame += pawns_midgame + kingSafety(board, game_state.white_king_location, "w") - kingSafety(
+        board, game_state.black_king_location, "b")
+    endgame += pawns_endgame
+
+    phase = min(phase, TOTAL_PHASE)
+    return (midgame * phase + endgame * (TOTAL_PHASE - phase)) / TOTAL_PHASE
+
+
+def pieceMobility(board, row, col, piece):
+    """
+    Number of squares the knight, bishop, rook or queen at row, col can move to, ignoring pins and checks.
+    """
+    ally_color = piece[0]
+    mobility = 0
+    if piece[1] == "N":
+        for d_row, d_col in knight_directions:
+            end_row = row + d_row
+            end_col = col + d_col
+            if 0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col][0] != ally_color:
+                mobility += 1
+        return mobility
+    for d_row, d_col in slider_directions[piece[1]]:
+        end_row = row + d_row
+        end_col = col + d_col
+        while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+            end_piece = board[end_row][end_col]
+            if end_piece == "--":
+                mobility += 1
+            else:
+                if end_piece[0] != ally_color:
+                    mobility += 1
+                break
+            end_row += d_row
+            end_col += d_col
+    return mobility
+
+
+def kingSafety(board, king_location, ally_color):
+    """
+    Midgame king safety for one side: pawn shield in front of a king on its back ranks, penalty for an open king file.
+    """
+    king_row, king_col = king_location
+    if ally_color == "w":
+        if king_row < 6:
+            return 0
+        forward = -1
+    else:
+        if king_row > 1:
+            return 0
+        forward = 1
+    pawn = ally_color + "P"
+    score = 0
+    for col in range(max(king_col - 1, 0), min(king_col + 2, 8)):
+        if board[king_row + forward][col] == pawn or board[king_row + 2 * forward][col] == pawn:
+            score += king_shield_bonus
+    for row in range(8):
+        if board[row][king_col] == pawn:
+            break
+    else:
+        score -= king_open_file_penalty
     return score
 
 
+def probePawnStructure(board, pawn_key):
+    """
+    Pawn structure score as (midgame, endgame), looked up in the pawn hash table first.
+    """
+    index = pawn_key & (PAWN_HASH_SIZE - 1)
+    entry = pawn_hash_table[index]
+    if entry is not None and entry[0] == pawn_key:
+        return entry[1], entry[2]
+    midgame, endgame = scorePawnStructure(board)
+    pawn_hash_table[index] = (pawn_key, midgame, endgame)
+    return midgame, endgame
+
+
+def scorePawnStructure(board):
+    """
+    Doubled, isolated and passed pawns for both sides as (midgame, endgame), positive is good for white.
+    """
+    white_pawn_rows = [[] for _ in range(8)]  # rows of the pawns on each file
+    black_pawn_rows = [[] for _ in range(8)]
+    for row in range(1, 7):
+        for col in range(8):
+            piece = board[row][col]
+            if piece == "wP":
+                white_pawn_rows[col].append(row)
+            elif piece == "bP":
+                black_pawn_rows[col].append(row)
+
+    midgame = endgame = 0
+    for col in range(8):
+        adjacent_cols = range(max(col - 1, 0), min(col + 2, 8))
+        for own_rows, enemy_rows, sign in ((white_pawn_rows, black_pawn_rows, 1),
+                                           (black_pawn_rows, white_pawn_rows, -1)):
+            pawns = own_rows[col]
+            if not pawns:
+                continue
+            if len(pawns) > 1:
+                midgame -= sign * doubled_pawn_penalty[0] * (len(pawns) - 1)
+                endgame -= sign * doubled_pawn_penalty[1] * (len(pawns) - 1)
+            if not any(own_rows[adjacent_col] for adjacent_col in adjacent_cols if adjacent_col != col):
+                midgame -= sign * isolated_pawn_penalty[0] * len(pawns)
+                endgame -= sign * isolated_pawn_penalty[1] * len(pawns)
+            for row in pawns:
+                # passed if no enemy pawn in front of it on its own or an adjacent file
+                if sign == 1:
+                    passed = not any(enemy_row < row for adjacent_col in adjacent_cols
+                                     for enemy_row in enemy_rows[adjacent_col])
+                    rank = 7 - row
+                else:
+                    passed = not any(enemy_row > row for adjacent_col in adjacent_cols
+                                     for enemy_row in enemy_rows[adjacent_col])
+                    rank = row
+                if passed:
+                    midgame += sign * passed_pawn_bonus[rank][0]
+                    endgame += sign * passed_pawn_bonus[rank][1]
+    return midgame, endgame
+
+
 def findRandomMove(valid_moves):
     """
     Picks and returns a random valid move.
@@ -0,0 +1,181 @@
+"""
+Persistent analysis cache.
+Finished searches are kept in a memory-mapped file keyed by the Zobrist key of the position, so deep results
+survive restarts and are served without searching again. ChessAI.searchPosition uses the cache installed as
+ChessAI.analysis_cache. The file has a fixed number of buckets of WAYS records each, a full bucket drops its
+least recently used record. The file is opened on first use and flushed to disk every FLUSH_INTERVAL seconds.
+Several processes may use the same file, records are checked like SharedTranspositionTable entries.
+A new file is written under a temporary name and linked into place whole, an existing file is never truncated.
+    python ChessAnalysisCache.py analysis.bin --fen "<fen>"
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"CEACHE1\0"
+HEADER = struct.Struct("<8sQQ")  # magic, number of buckets, access clock
+RECORD = struct.Struct("<QQQ")  # check word, score bits, move id | depth << 16 | last use << 32
+SCORE = struct.Struct("<d")
+SCORE_BITS = struct.Struct("<Q")
+WAYS = 4  # records per bucket
+SIZE_MB = 64
+MIN_DEPTH = 5  # shallower results are cheaper to search again than to store
+FLUSH_INTERVAL = 30  # seconds
+
+
+def createCacheFile(path, size_mb=SIZE_MB):
+    """
+    Create an empty cache file with room for size_mb at path, unless a file is there already.
+    Processes racing to create it each write a temporary file and only one of them links it into place,
+    so no process ever sees a file that is still being sized.
+    """
+    if os.path.exists(path):
+        return
+    buckets = max(1, size_mb * 1024 * 1024 // (WAYS * RECORD.size))
+    temp_path = path + "." + str(os.getpid()) + ".tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, buckets, 0))
+            file.truncate(HEADER.size + buckets * WAYS * RECORD.size)
+        os.link(temp_path, path)
+    except FileExistsError:
+        pass  # another process created it first
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class AnalysisCache:
+    """
+    probe and store results of whole searches: (depth, score, best move id) per position key.
+    With create False the file must exist already, e.g. in pool workers whose parent created it.
+    """
+
+    def __init__(self, path, size_mb=SIZE_MB, min_depth=MIN_DEPTH, create=True):
+        self.path = path
+        self.size_mb = size_mb
+        self.min_depth = min_depth
+        self.create = create
+        self.file = None
+        self.data = None
+        self.buckets = 0
+        self.clock = 0
+        self.last_flush = time.time()
+
+    def open(self):
+        """
+        Map the file, creating it with room for size_mb if it does not exist and create is set.
+        An existing file keeps the size it was created with.
+        """
+        if self.create:
+            createCacheFile(self.path, self.size_mb)
+        self.file = open(self.path, "r+b")
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            self.file = None
+            raise ValueError(self.path + " is not an analysis cache")
+        self.data = mmap.mmap(self.file.fileno(), 0)
+        magic, self.buckets, self.clock = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or len(self.data) < HEADER.size + self.buckets * WAYS * RECORD.size:
+            self.data.close()
+            self.file.close()
+            self.data = None
+            self.file = None
+            raise ValueError(self.path + " is not an analysis cache")
+
+    def close(self):
+        if self.data is not None:
+            self.flush()
+            self.data.close()
+            self.file.close()
+            self.data = None
+            self.file = None
+
+    def flush(self):
+        HEADER.pack_into(self.data, 0, MAGIC, self.buckets, self.clock)
+        self.data.flush()
+        self.last_flush = time.time()
+
+    def readRecord(self, offset):
+        """
+        (key, depth, score, move id, last use) of the record at offset, None for an empty or torn record.
+        """
+        check, score_bits, info = RECORD.unpack_from(self.data, offset)
+        if info == 0:
+            return None
+        return check ^ score_bits ^ info, info >> 16 & 0xFFFF, SCORE.unpack(SCORE_BITS.pack(score_bits))[0], \
+            info & 0xFFFF, info >> 32
+
+    def writeRecord(self, offset, key, depth, score, move_id):
+        self.clock = (self.clock + 1) & 0xFFFFFFFF
+        score_bits = SCORE_BITS.unpack(SCORE.pack(score))[0]
+        info = self.clock << 32 | depth << 16 | move_id
+        RECORD.pack_into(self.data, offset, key ^ score_bits ^ info, score_bits, info)
+
+    def bucketOffsets(self, key):
+        first = HEADER.size + (key % self.buckets) * WAYS * RECORD.size
+        return range(first, first + WAYS * RECORD.size, RECORD.size)
+
+    def probe(self, key):
+        """
+        (depth, score, move id) stored for the position key, or None.
+        """
+        if self.data is None:
+            self.open()
+        for offset in self.bucketOffsets(key):
+            record = self.readRecord(offset)
+            if record is not None and record[0] == key:
+                self.writeRecord(offset, key, record[1], record[2], record[3])  # mark it as recently used
+                return record[1], record[2], record[3]
+        return None
+
+    def store(self, key, depth, score, move_id):
+        """
+        Keep a finished search of at least min_depth, a deeper result already stored for the key is kept.
+        """
+        if depth < self.min_depth:
+            return
+        if self.data is None:
+            self.open()
+        victim = victim_use = None
+        for offset in self.bucketOffsets(key):
+            record = self.readRecord(offset)
+            if record is not None and record[0] == key:
+                if record[1] > depth:
+                    return
+                victim = offset
+                break
+            last_use = -1 if record is None else record[4]  # empty records are used first
+            if victim is None or last_use < victim_use:
+                victim, victim_use = offset, last_use
+        self.writeRecord(victim, key, depth, score, move_id)
+        if time.time() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+
+def main():
+    import ChessEngine
+    import ChessPGN
+    parser = argparse.ArgumentParser(description="Look up a position in an analysis cache.")
+    parser.add_argument("cache")
+    parser.add_argument("--fen", default=ChessEngine.STARTING_FEN)
+    args = parser.parse_args()
+    game_state = ChessEngine.GameState()
+    game_state.loadFen(args.fen)
+    cache = AnalysisCache(args.cache)
+    entry = cache.probe(game_state.zobrist_key)
+    if entry is None:
+        print("not in cache")
+    else:
+        depth, score, move_id = entry
+        valid_moves = game_state.getValidMoves()
+        moves = [move for move in valid_moves if move.moveID == move_id]
+        print("depth", depth, "score", score, "move", ChessPGN.moveToSan(game_state, moves[0], valid_moves)
+              if moves else move_id)
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Scoring many positions at once with NumPy.
+Used for offline work like batch game review and training-data labelling,
+scores match ChessAI.scoreMaterial, the material and piece-square part of the evaluation.
+The mobility, king safety and pawn structure terms of the rich evaluation are not modelled, so these are not
+the scores of ChessAI.scoreBoard unless ChessAI.RICH_EVALUATION is off.
+"""
+import numpy as np
+import ChessAI
+
+# piece codes are shared with ChessAI, 0 is an empty square
+# in the (N, 12, 64) encoding plane i holds the piece with code i + 1
+PIECES = ChessAI.pieces
+PIECE_CODES = ChessAI.piece_codes
+
+# signed material + piece-square value of every piece code on every square (square = row * 8 + col)
+# taken from the same compiled tables as scoreMaterial, so batch scores match it exactly
+SQUARE_VALUES = np.array(ChessAI.midgame_square_values, dtype=np.float64)
+SQUARES = np.arange(64)
+
+
+def gameStateToCodes(game_state):
+    """
+    Encode the board of a GameState as a (64,) int8 array of piece codes.
+    """
+    return np.array([PIECE_CODES[piece] for row in game_state.board for piece in row], dtype=np.int8)
+
+
+def gameStatesToCodes(game_states):
+    """
+    Encode the boards of a sequence of GameStates as a (N, 64) int8 array of piece codes.
+    """
+    codes = np.zeros((len(game_states), 64), dtype=np.int8)
+    for i, game_state in enumerate(game_states):
+        codes[i] = gameStateToCodes(game_state)
+    return codes
+
+
+def codesToPlanes(codes):
+    """
+    Convert (N, 64) piece codes to (N, 12, 64) one-hot piece planes.
+    """
+    codes = np.asarray(codes)
+    return (codes[:, None, :] == np.arange(1, len(PIECES) + 1, dtype=np.int8)[None, :, None]).astype(np.int8)
+
+
+def planesToCodes(planes):
+    """
+    Convert (N, 12, 64) one-hot piece planes to (N, 64) piece codes.
+    """
+    planes = np.asarray(planes, dtype=np.int8)
+    return (planes * np.arange(1, len(PIECES) + 1, dtype=np.int8)[None, :, None]).sum(axis=1, dtype=np.int8)
+
+
+def scorePositions(positions):
+    """
+    Score N positions given as (N, 64) piece codes or (N, 12, 64) piece planes.
+    Returns a (N,) float64 array, a positive score is good for white, a negative score is good for black.
+    Squares are accumulated in board order (a8 to h1) like scoreMaterial does, so the floats are identical.
+    """
+    positions = np.asarray(positions)
+    if positions.ndim == 3:
+        codes = planesToCodes(positions)
+    elif positions.ndim == 2:
+        codes = positions
+    else:
+        raise ValueError("Expected a (N, 64) or (N, 12, 64) array, got shape " + str(positions.shape))
+    if codes.shape[-1] != 64:
+        raise ValueError("Expected 64 squares per position, got " + str(codes.shape[-1]))
+    if len(codes) == 0:
+        return np.zeros(0, dtype=np.float64)
+    values = SQUARE_VALUES[codes.astype(np.intp), SQUARES]
+    return np.cumsum(values, axis=1)[:, -1]
+
+
+def scoreGameStates(game_states):
+    """
+    Score a sequence of GameStates, including the checkmate and stalemate flags.
+    Matches ChessAI.scoreBoard, which it only can with RICH_EVALUATION turned off, so it raises ValueError
+    otherwise. scorePositions gives the material and piece-square scores in either configuration.
+    """
+    if ChessAI.RICH_EVALUATION:
+        raise ValueError("scoreGameStates matches scoreBoard only with ChessAI.RICH_EVALUATION off, "
+                         "use scorePositions for material and piece-square scores")
+    scores = scorePositions(gameStatesToCodes(game_states))
+    for i, game_state in enumerate(game_states):
+        if game_state.checkmate:
+            scores[i] = -ChessAI.CHECKMATE if game_state.white_to_move else ChessAI.CHECKMATE
+        elif game_state.stalemate:
+            scores[i] = ChessAI.STALEMATE
+    return scores
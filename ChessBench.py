@@ -0,0 +1,117 @@
+"""
+Standard search benchmark.
+Searches every position of BENCH_POSITIONS to a fixed depth, each from empty tables, and prints the nodes of
+every position and their total. The total is the bench signature: it only changes when a change to the search
+or the evaluation changes what gets searched, so a commit that should not change play must keep it.
+Time and NPS compare the speed of commits on the same machine.
+The search is called directly, without the random move shuffle of the GUI's move finder.
+    python ChessBench.py --depth 3
+"""
+import argparse
+import time
+import ChessEngine
+import ChessAI
+
+BENCH_DEPTH = 3
+BENCH_POSITIONS = (
+    # openings
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkb1r/pppppppp/5n2/8/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 1 2",
+    "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq c6 0 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq d6 0 2",
+    "rnbqkbnr/pp2pppp/2p5/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 3",
+    "rnbqkbnr/pppp1ppp/4p3/8/3PP3/8/PPP2PPP/RNBQKBNR b KQkq - 0 2",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5",
+    "rnbqk2r/ppp1ppbp/3p1np1/8/2PPP3/2N5/PP3PPP/R1BQKBNR w KQkq - 0 5",
+    "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4",
+    "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    # middlegames
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 10",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "4rrk1/pp1n3p/3q2pQ/2p1pb2/2PP4/2P3N1/P2B2PP/4RRK1 b - - 7 19",
+    "rq3rk1/ppp2ppp/1bnpb3/3N2B1/3NP3/7P/PPPQ1PP1/2KR3R w - - 7 14",
+    "r1bq1r1k/1pp1n1pp/1p1p4/4p2Q/4Pp2/1BNP4/PPP2PPP/3R1RK1 w - - 2 14",
+    "r3r1k1/2p2ppp/p1p1bn2/8/1q2P3/2NPQN2/PPP3PP/R4RK1 b - - 2 15",
+    "r1bbk1nr/pp3p1p/2n5/1N4p1/2Np1B2/8/PPP2PPP/2KR1B1R w kq - 0 13",
+    "r1bq1rk1/ppp1nppp/4n3/3p3Q/3P4/1BP1B3/PP1N2PP/R4RK1 w - - 1 16",
+    "4r1k1/r1q2ppp/ppp2n2/4P3/5Rb1/1N1BQ3/PPP3PP/R5K1 w - - 1 17",
+    "2rqkb1r/ppp2p2/2npb1p1/1N1Nn2p/2P1PP2/8/PP2B1PP/R1BQK2R b KQ - 0 11",
+    "r1bq1r1k/b1p1npp1/p2p3p/1p6/3PP3/1B2NN2/PP3PPP/R2Q1RK1 w - - 1 16",
+    "3r1rk1/p5pp/bpp1pp2/8/q1PP1P2/b3P3/P2NQRPP/1R2B1K1 b - - 6 22",
+    "r1q2rk1/2p1bppp/2Pp4/p6b/Q1PNp3/4B3/PP1R1PPP/2K4R w - - 2 18",
+    "4k2r/1pb2ppp/1p2p3/1R1p4/3P4/2r1PN2/P4PPP/1R4K1 b - - 3 22",
+    "3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 4 26",
+    "6k1/3b3r/1p1p4/p1n2p2/1PPNpP1q/P3Q1p1/1R1RB1P1/5K2 b - - 0 1",
+    "r2r1n2/pp2bk2/2p1p2p/3q4/3PN1QP/2P3R1/P4PP1/5RK1 w - - 0 1",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+    "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1",
+    "r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1",
+    # endgames
+    "6k1/6p1/6Pp/ppp5/3pn2P/1P3K2/1PP2P2/8 b - - 3 54",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 11",
+    "8/pp3k2/2p5/3p4/3P4/2P5/PP3K2/8 w - - 0 1",
+    "6k1/5p2/6p1/8/7p/8/6PP/6K1 b - - 0 1",
+    "8/8/8/8/5kp1/P7/8/1K1N4 w - - 0 1",
+    "8/8/8/5N2/8/p7/8/2NK3k w - - 0 1",
+    "8/3k4/8/8/8/4B3/4KB2/2B5 w - - 0 1",
+    "8/8/1P6/5pr1/8/4R3/7k/2K5 w - - 0 1",
+    "8/2p4P/8/kr6/6R1/8/8/1K6 w - - 0 1",
+    "8/8/3P3k/8/1p6/8/1P6/1K3n2 b - - 0 1",
+    "8/R7/2q5/8/6k1/8/1P5p/K6R w - - 0 124",
+    "8/8/4k3/8/2K5/8/3P4/8 w - - 0 1",
+    "8/5k2/8/8/8/8/1R6/4K3 w - - 0 1",
+    "7k/P7/8/8/8/8/8/K7 w - - 0 1",
+    "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1",
+    "8/8/8/8/8/5k2/6p1/6K1 w - - 0 1",
+)
+
+
+def runBench(depth=BENCH_DEPTH, fens=BENCH_POSITIONS, verbose=True):
+    """
+    Search every position to depth, returns (total nodes, seconds).
+    """
+    analysis_cache = ChessAI.analysis_cache
+    ChessAI.analysis_cache = None  # stored results would skip searches
+    total_nodes = 0
+    total_time = 0.0
+    try:
+        for number, fen in enumerate(fens, 1):
+            game_state = ChessEngine.GameState()
+            game_state.loadFen(fen)
+            ChessAI.transposition_table.clear()
+            ChessAI.clearEvalCache()
+            ChessAI.move_cache.clear()
+            start_time = time.perf_counter()
+            move, score = ChessAI.searchPosition(game_state, max_depth=depth)
+            elapsed = time.perf_counter() - start_time
+            nodes = ChessAI.search_stats["nodes"] if move is not None else 0
+            total_nodes += nodes
+            total_time += elapsed
+            if verbose:
+                print("Position %2d/%d: %-6s %8d nodes %7.2f s  %s" % (number, len(fens), move.getUciNotation() if
+                                                                     move is not None else "-", nodes, elapsed, fen))
+    finally:
+        ChessAI.analysis_cache = analysis_cache
+    return total_nodes, total_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the benchmark positions to a fixed depth.")
+    parser.add_argument("--depth", type=int, default=BENCH_DEPTH)
+    parser.add_argument("--quiet", action="store_true", help="only print the totals")
+    args = parser.parse_args()
+    nodes, seconds = runBench(args.depth, verbose=not args.quiet)
+    print("===========================")
+    print("Total time (ms) : " + str(int(seconds * 1000)))
+    print("Nodes searched  : " + str(nodes))
+    print("Nodes/second    : " + str(int(nodes / seconds) if seconds > 0 else 0))
+
+
+if __name__ == "__main__":
+    main()
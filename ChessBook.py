@@ -0,0 +1,222 @@
+"""
+Opening book built from our own PGN archives.
+build streams the games, replays them through GameState.makeMove up to a ply limit and counts how often
+every move was played in every position (keyed by the Zobrist key) and how it scored, in parallel chunks
+whose counts are merged at the end. The result is written as a sorted file of fixed-size records,
+so OpeningBook can memory-map it and find a position with a binary search.
+    python ChessBook.py build games.pgn book.bin --ply 20
+    python ChessBook.py probe book.bin --fen "<fen>"
+"""
+import argparse
+import mmap
+import multiprocessing
+import random
+import struct
+import ChessEngine
+import ChessPGN
+
+MAGIC = b"CEBOOK1\0"
+HEADER = struct.Struct(">8sQ")  # magic, number of records
+RECORD = struct.Struct(">QHHI")  # position key, move, games, score in half points for the side that moved
+MAX_COUNT = 0xFFFF
+DEFAULT_PLY = 20
+CHUNK_SIZE = 200  # games per map task
+HALF_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}  # (white, black)
+
+
+def encodeMove(move):
+    """
+    16-bit move code: start square, end square (row * 8 + col) and promotion piece (0 for none, 1-4 for Q R B N).
+    """
+    promotion = ChessEngine.Move.promotion_pieces.index(move.promotion_piece) + 1 if move.is_pawn_promotion else 0
+    return (move.start_row * 8 + move.start_col) | (move.end_row * 8 + move.end_col) << 6 | promotion << 12
+
+
+def decodeMove(code, valid_moves):
+    """
+    The legal move with the given code, or None.
+    """
+    for move in valid_moves:
+        if encodeMove(move) == code:
+            return move
+    return None
+
+
+def countGames(games, max_ply):
+    """
+    Map step: {(position key, move code): [games, half points]} for a chunk of PgnGames.
+    Games with an illegal move are counted up to that move.
+    """
+    counts = {}
+    for game in games:
+        if game.result not in HALF_POINTS:
+            continue
+        white_points, black_points = HALF_POINTS[game.result]
+        try:
+            for ply, (game_state, move) in enumerate(game.replay()):
+                if ply >= max_ply:
+                    break
+                entry = counts.setdefault((game_state.zobrist_key, encodeMove(move)), [0, 0])
+                entry[0] += 1
+                entry[1] += white_points if game_state.white_to_move else black_points
+        except ValueError:
+            continue
+    return counts
+
+
+def countChunk(task):
+    games, max_ply = task
+    return countGames(games, max_ply)
+
+
+def chunks(games, max_ply, size=CHUNK_SIZE):
+    chunk = []
+    for game in games:
+        chunk.append(game)
+        if len(chunk) == size:
+            yield chunk, max_ply
+            chunk = []
+    if chunk:
+        yield chunk, max_ply
+
+
+def mergeCounts(total, counts):
+    """
+    Reduce step: add the counts of one chunk into the total.
+    """
+    for key, (games, points) in counts.items():
+        entry = total.get(key)
+        if entry is None:
+            total[key] = [games, points]
+        else:
+            entry[0] += games
+            entry[1] += points
+    return total
+
+
+def buildBook(pgn_paths, book_path, max_ply=DEFAULT_PLY, min_games=1, processes=None):
+    """
+    Build a book from PGN files, returns the number of records written.
+    """
+    def allGames():
+        for path in pgn_paths:
+            for game in ChessPGN.readGamesFromFile(path):
+                yield game
+
+    total = {}
+    with multiprocessing.Pool(processes) as pool:
+        for counts in pool.imap_unordered(countChunk, chunks(allGames(), max_ply)):
+            mergeCounts(total, counts)
+    return writeBook(book_path, total, min_games)
+
+
+def writeBook(book_path, counts, min_games=1):
+    records = sorted((key, move, games, points) for (key, move), (games, points) in counts.items()
+                     if games >= min_games)
+    with open(book_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(records)))
+        for key, move, games, points in records:
+            if games > MAX_COUNT:
+                points = points * MAX_COUNT // games  # keep the score fraction when the count is clipped
+                games = MAX_COUNT
+            file.write(RECORD.pack(key, move, games, points))
+    return len(records)
+
+
+class OpeningBook:
+    """
+    Read-only memory-mapped book, lookups are a binary search over the sorted records.
+    """
+
+    def __init__(self, book_path):
+        self.file = open(book_path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file cannot be mapped
+            self.file.close()
+            raise ValueError(book_path + " is not an opening book")
+        magic, self.size = HEADER.unpack_from(self.data, 0) if len(self.data) >= HEADER.size else (None, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(book_path + " is not an opening book")
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def record(self, index):
+        return RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+
+    def probe(self, key):
+        """
+        [(move code, games, half points)] stored for the position key.
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size:
+            record = self.record(low)
+            if record[0] != key:
+                break
+            entries.append(record[1:])
+            low += 1
+        return entries
+
+    def getMoves(self, game_state, valid_moves=None):
+        """
+        [(move, games, score fraction)] of the legal book moves in the position, most played first.
+        """
+        if valid_moves is None:
+            valid_moves = game_state.getValidMoves()
+        moves = []
+        for code, games, points in self.probe(game_state.zobrist_key):
+            move = decodeMove(code, valid_moves)
+            if move is not None:
+                moves.append((move, games, points / (2 * games)))
+        moves.sort(key=lambda entry: -entry[1])
+        return moves
+
+    def pickMove(self, game_state, valid_moves=None, rng=random):
+        """
+        A book move chosen at random weighted by how often it was played, None when out of book.
+        """
+        moves = self.getMoves(game_state, valid_moves)
+        if not moves:
+            return None
+        return rng.choices([move for move, games, score in moves], weights=[games for move, games, score in moves])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect an opening book.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="build a book from PGN files")
+    build_parser.add_argument("pgn", nargs="+")
+    build_parser.add_argument("book")
+    build_parser.add_argument("--ply", type=int, default=DEFAULT_PLY, help="plies per game to include")
+    build_parser.add_argument("--min-games", type=int, default=1, help="drop moves played fewer times")
+    build_parser.add_argument("--processes", type=int, default=None)
+    probe_parser = subparsers.add_parser("probe", help="list the book moves of a position")
+    probe_parser.add_argument("book")
+    probe_parser.add_argument("--fen", default=ChessEngine.STARTING_FEN)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        records = buildBook(args.pgn, args.book, args.ply, args.min_games, args.processes)
+        print("Wrote", records, "records to", args.book)
+    else:
+        book = OpeningBook(args.book)
+        game_state = ChessEngine.GameState()
+        game_state.loadFen(args.fen)
+        valid_moves = game_state.getValidMoves()
+        for move, games, score in book.getMoves(game_state, valid_moves):
+            print(ChessPGN.moveToSan(game_state, move, valid_moves), games, "%.1f%%" % (score * 100))
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Cold start check for headless use of the engine.
+Spawns a fresh search worker process and measures the time until
+it answers its first search, then imports every headless module in a fresh interpreter. Fails when the worker
+is slower than the budget or when anything pulled in pygame or one of the optional heavy dependencies,
+which must only be loaded by the modules that use them (pygame by ChessGUI, numpy by ChessBatchEval).
+    python ChessColdStart.py --budget 1.0
+"""
+import argparse
+import multiprocessing
+import subprocess
+import sys
+import time
+import ChessEngine
+import ChessAI
+
+COLD_START_BUDGET = 1.0  # seconds from starting the worker process to its first move
+HEADLESS_MODULES = ("ChessEngine", "ChessAI", "ChessPGN", "ChessBook", "ChessUCI", "ChessServer", "ChessMatch",
+                    "ChessMain")
+OPTIONAL_MODULES = ("pygame", "numpy")
+
+
+def loadedOptionalModules():
+    return [name for name in OPTIONAL_MODULES if name in sys.modules]
+
+
+def probeWorker(return_queue):
+    """
+    Runs in the spawned process: one shallow search, then report what got imported.
+    """
+    game_state = ChessEngine.GameState()
+    best_move, score = ChessAI.searchPosition(game_state, max_depth=1)
+    return_queue.put((best_move.getUciNotation(), loadedOptionalModules()))
+
+
+def measureWorker():
+    """
+    (seconds until the first move, optional modules the worker loaded) for a freshly spawned worker.
+    """
+    context = multiprocessing.get_context("spawn")
+    return_queue = context.Queue()
+    start_time = time.perf_counter()
+    process = context.Process(target=probeWorker, args=(return_queue,))
+    process.start()
+    move, loaded = return_queue.get()
+    elapsed = time.perf_counter() - start_time
+    process.join()
+    return elapsed, loaded
+
+
+def measureImport(module):
+    """
+    (seconds to import module in a fresh interpreter, optional modules the import loaded).
+    """
+    code = ("import sys, time\n"
+            "start_time = time.perf_counter()\n"
+            "import " + module + "\n"
+            "print(time.perf_counter() - start_time)\n"
+            "print(','.join(name for name in " + repr(OPTIONAL_MODULES) + " if name in sys.modules))\n")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split("\n")
+    return float(output[0]), [name for name in output[1].split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of a headless search worker.")
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET, help="seconds allowed for the worker")
+    args = parser.parse_args()
+
+    failed = False
+    for module in HEADLESS_MODULES:
+        elapsed, loaded = measureImport(module)
+        print("import %-12s %6.1f ms %s" % (module, elapsed * 1000, "loads " + ", ".join(loaded) if loaded else ""))
+        failed = failed or bool(loaded)
+    elapsed, loaded = measureWorker()
+    print("search worker       %6.1f ms (budget %.0f ms) %s" % (elapsed * 1000, args.budget * 1000,
+                                                              "loads " + ", ".join(loaded) if loaded else ""))
+    failed = failed or bool(loaded) or elapsed > args.budget
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,30 @@ Storing all the information about the current state of chess game.
 Determining valid moves at current state.
 It will keep move log.
 """
+import random
+import struct
+from array import array
+
+# Zobrist hashing - every (piece, square), the side to move, each set of castling rights and each en-passant file
+# gets a random 64-bit number, a position's key is the XOR of the numbers that describe it.
+# The generator is seeded so keys are the same in every process.
+zobrist_random = random.Random(20230601)
+ZOBRIST_PIECES = {piece: [zobrist_random.getrandbits(64) for _ in range(64)]
+                  for piece in ("wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")}
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [zobrist_random.getrandbits(64) for _ in range(16)]  # indexed by CastleRights.index()
+ZOBRIST_ENPASSANT = [zobrist_random.getrandbits(64) for _ in range(8)]  # indexed by the en-passant file
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Packed positions for passing between processes and storing on disk: two squares per byte as 4-bit piece codes,
+# then the side to move (0x10) with the castling rights (CastleRights.index()), the en-passant file (8 for none),
+# the halfmove clock and the fullmove number, 37 bytes in all.
+PACKED_PIECES = ("--", "wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")
+PACKED_PIECE_CODES = {piece: code for code, piece in enumerate(PACKED_PIECES)}
+PACKED_POSITION = struct.Struct(">32sBBBH")
+
+MOVE_CACHE_SIZE = 1 << 15  # positions kept by a MoveCache
 
 
 class GameState:
@@ -38,12 +62,181 @@ class GameState:
         self.current_castling_rights = CastleRights(True, True, True, True)
         self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.halfmove_clock = 0  # half-moves since the last capture or pawn advance, for the fifty-move rule
+        self.halfmove_clock_log = [self.halfmove_clock]
+        self.fullmove_number = 1
+        self.zobrist_key = self.computeZobristKey()
+        self.pawn_key = self.computePawnKey()
+        self.zobrist_key_log = [self.zobrist_key]
+        self.pawn_key_log = [self.pawn_key]
+        self.move_cache = None  # optional MoveCache shared by getValidMoves calls
+
+    def loadFen(self, fen):
+        """
+        Set up the position described by a FEN string, the move log is cleared.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("Invalid FEN: " + fen)
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("Invalid FEN board: " + fields[0])
+        board = []
+        for row, fen_row in enumerate(rows):
+            board_row = []
+            for char in fen_row:
+                if char.isdigit():
+                    board_row.extend(["--"] * int(char))
+                elif char.upper() in "PNBRQK":
+                    piece = ("w" if char.isupper() else "b") + char.upper()
+                    if piece == "wK":
+                        self.white_king_location = (row, len(board_row))
+                    elif piece == "bK":
+                        self.black_king_location = (row, len(board_row))
+                    board_row.append(piece)
+                else:
+                    raise ValueError("Invalid FEN board: " + fields[0])
+            if len(board_row) != 8:
+                raise ValueError("Invalid FEN board: " + fields[0])
+            board.append(board_row)
+        self.board = board
+        self.white_to_move = fields[1] == "w"
+        self.current_castling_rights = CastleRights("K" in fields[2], "k" in fields[2],
+                                                    "Q" in fields[2], "q" in fields[2])
+        if fields[3] == "-":
+            self.enpassant_possible = ()
+        elif len(fields[3]) != 2 or fields[3][0] not in Move.files_to_cols or fields[3][1] not in Move.ranks_to_rows:
+            raise ValueError("Invalid FEN en passant square: " + fields[3])
+        else:
+            self.enpassant_possible = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.resetLogs()
+
+    def resetLogs(self):
+        """
+        Start a fresh history from the position set up by loadFen or loadPackedPosition.
+        """
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        self.enpassant_possible_log = [self.enpassant_possible]
+        self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
+                                               self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.halfmove_clock_log = [self.halfmove_clock]
+        self.zobrist_key = self.computeZobristKey()
+        self.pawn_key = self.computePawnKey()
+        self.zobrist_key_log = [self.zobrist_key]
+        self.pawn_key_log = [self.pawn_key]
+
+    def packPosition(self):
+        """
+        The position as PACKED_POSITION.size bytes, without the move history.
+        """
+        codes = [PACKED_PIECE_CODES[piece] for row in self.board for piece in row]
+        rights = self.current_castling_rights
+        flags = (0x10 if self.white_to_move else 0) | rights.index()
+        enpassant_col = self.enpassant_possible[1] if self.enpassant_possible else 8
+        return PACKED_POSITION.pack(bytes([codes[i] << 4 | codes[i + 1] for i in range(0, 64, 2)]), flags,
+                                    enpassant_col, min(self.halfmove_clock, 255), min(self.fullmove_number, 0xFFFF))
+
+    def loadPackedPosition(self, data):
+        """
+        Set up a position written by packPosition, the move log is cleared.
+        """
+        if len(data) != PACKED_POSITION.size:
+            raise ValueError("Packed position must be " + str(PACKED_POSITION.size) + " bytes")
+        board_bytes, flags, enpassant_col, halfmove_clock, fullmove_number = PACKED_POSITION.unpack(data)
+        squares = []
+        for byte in board_bytes:
+            if byte >> 4 >= len(PACKED_PIECES) or byte & 15 >= len(PACKED_PIECES):
+                raise ValueError("Invalid piece code in packed position")
+            squares.append(PACKED_PIECES[byte >> 4])
+            squares.append(PACKED_PIECES[byte & 15])
+        self.board = [squares[row * 8:row * 8 + 8] for row in range(8)]
+        if "wK" in squares:
+            self.white_king_location = divmod(squares.index("wK"), 8)
+        if "bK" in squares:
+            self.black_king_location = divmod(squares.index("bK"), 8)
+        self.white_to_move = bool(flags & 0x10)
+        self.current_castling_rights = CastleRights(bool(flags & 1), bool(flags & 2), bool(flags & 4), bool(flags & 8))
+        if enpassant_col < 8:
+            self.enpassant_possible = (2 if self.white_to_move else 5, enpassant_col)
+        else:
+            self.enpassant_possible = ()
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.resetLogs()
+
+    def getFen(self):
+        """
+        FEN string of the current position.
+        """
+        fen_rows = []
+        for row in self.board:
+            fen_row = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    fen_row += str(empty)
+                    empty = 0
+                fen_row += piece[1] if piece[0] == "w" else piece[1].lower()
+            if empty:
+                fen_row += str(empty)
+            fen_rows.append(fen_row)
+        rights = self.current_castling_rights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + (
+            "q" if rights.bqs else "")
+        enpassant = "-"
+        if self.enpassant_possible != ():
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        return " ".join(["/".join(fen_rows), "w" if self.white_to_move else "b", castling or "-", enpassant,
+                         str(self.halfmove_clock), str(self.fullmove_number)])
+
+    def computeZobristKey(self):
+        """
+        Zobrist key of the whole position, computed from scratch.
+        makeMove and undoMove keep self.zobrist_key up to date incrementally.
+        """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][row * 8 + col]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.current_castling_rights.index()]
+        if self.enpassant_possible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_possible[1]]
+        return key
+
+    def computePawnKey(self):
+        """
+        Zobrist key of the pawns only, computed from scratch.
+        Used to cache pawn structure evaluation, it changes only on pawn moves and pawn captures.
+        """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece[1] == "P":
+                    key ^= ZOBRIST_PIECES[piece][row * 8 + col]
+        return key
 
     def makeMove(self, move):
         """
         Takes a Move as a parameter and executes it.
         (this will not work for castling, pawn promotion and en-passant)
         """
+        castling_index = self.current_castling_rights.index()
+        enpassant_possible = self.enpassant_possible
         self.board[move.start_row][move.start_col] = "--"
         self.board[move.end_row][move.end_col] = move.piece_moved
         self.move_log.append(move)  # log the move so we can undo it later
@@ -56,11 +249,7 @@ class GameState:
 
         # pawn promotion
         if move.is_pawn_promotion:
-            # if not is_AI:
-            #    promoted_piece = input("Promote to Q, R, B, or N:") #take this to UI later
-            #    self.board[move.end_row][move.end_col] = move.piece_moved[0] + promoted_piece
-            # else:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
+            self.board[move.end_row][move.end_col] = move.piece_moved[0] + move.promotion_piece
 
         # enpassant move
         if move.is_enpassant_move:
@@ -85,11 +274,61 @@ class GameState:
 
         self.enpassant_possible_log.append(self.enpassant_possible)
 
+        # update move counters
+        if move.piece_moved[1] == "P" or move.piece_captured != "--":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        self.halfmove_clock_log.append(self.halfmove_clock)
+        if move.piece_moved[0] == "b":
+            self.fullmove_number += 1
+
         # update castling rights - whenever it is a rook or king move
         self.updateCastleRights(move)
         self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                    self.current_castling_rights.wqs, self.current_castling_rights.bqs))
 
+        self.updateZobristKeys(move, castling_index, enpassant_possible)
+        self.zobrist_key_log.append(self.zobrist_key)
+        self.pawn_key_log.append(self.pawn_key)
+
+    def updateZobristKeys(self, move, castling_index, enpassant_possible):
+        """
+        Incrementally update the position and pawn keys after the board has been changed by move.
+        castling_index and enpassant_possible describe the position before the move.
+        """
+        start_square = move.start_row * 8 + move.start_col
+        end_square = move.end_row * 8 + move.end_col
+        placed_piece = self.board[move.end_row][move.end_col]  # differs from piece_moved on promotion
+        piece_keys = ZOBRIST_PIECES[move.piece_moved][start_square] ^ ZOBRIST_PIECES[placed_piece][end_square]
+        pawn_keys = 0
+        if move.piece_moved[1] == "P":
+            pawn_keys ^= ZOBRIST_PIECES[move.piece_moved][start_square]
+        if placed_piece[1] == "P":
+            pawn_keys ^= ZOBRIST_PIECES[placed_piece][end_square]
+        if move.piece_captured != "--":
+            if move.is_enpassant_move:
+                captured_square = move.start_row * 8 + move.end_col
+            else:
+                captured_square = end_square
+            piece_keys ^= ZOBRIST_PIECES[move.piece_captured][captured_square]
+            if move.piece_captured[1] == "P":
+                pawn_keys ^= ZOBRIST_PIECES[move.piece_captured][captured_square]
+        if move.is_castle_move:
+            rook = move.piece_moved[0] + "R"
+            if move.end_col - move.start_col == 2:  # king-side
+                piece_keys ^= ZOBRIST_PIECES[rook][end_square + 1] ^ ZOBRIST_PIECES[rook][end_square - 1]
+            else:  # queen-side
+                piece_keys ^= ZOBRIST_PIECES[rook][end_square - 2] ^ ZOBRIST_PIECES[rook][end_square + 1]
+        key = self.zobrist_key ^ piece_keys ^ ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[castling_index] ^ ZOBRIST_CASTLING[self.current_castling_rights.index()]
+        if enpassant_possible != ():
+            key ^= ZOBRIST_ENPASSANT[enpassant_possible[1]]
+        if self.enpassant_possible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_possible[1]]
+        self.zobrist_key = key
+        self.pawn_key ^= pawn_keys
+
     def undoMove(self):
         """
         Undo the last move
@@ -112,10 +351,19 @@ class GameState:
             self.enpassant_possible_log.pop()
             self.enpassant_possible = self.enpassant_possible_log[-1]
 
+            # undo move counters
+            self.halfmove_clock_log.pop()
+            self.halfmove_clock = self.halfmove_clock_log[-1]
+            if move.piece_moved[0] == "b":
+                self.fullmove_number -= 1
+
             # undo castle rights
             self.castle_rights_log.pop()  # get rid of the new castle rights from the move we are undoing
-            self.current_castling_rights = self.castle_rights_log[
-                -1]  # set the current castle rights to the last one in the list
+            last_rights = self.castle_rights_log[-1]
+            # set the current castle rights to a copy of the last one in the list,
+            # the next makeMove updates them in place and must not change the log entry
+            self.current_castling_rights = CastleRights(last_rights.wks, last_rights.bks,
+                                                        last_rights.wqs, last_rights.bqs)
             # undo the castle move
             if move.is_castle_move:
                 if move.end_col - move.start_col == 2:  # king-side
@@ -124,6 +372,10 @@ class GameState:
                 else:  # queen-side
                     self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
                     self.board[move.end_row][move.end_col + 1] = '--'
+            self.zobrist_key_log.pop()
+            self.pawn_key_log.pop()
+            self.zobrist_key = self.zobrist_key_log[-1]
+            self.pawn_key = self.pawn_key_log[-1]
             self.checkmate = False
             self.stalemate = False
 
@@ -164,6 +416,23 @@ class GameState:
     def getValidMoves(self):
         """
         All moves considering checks.
+        With a move_cache set, the moves of a position generated before come from the cache.
+        """
+        if self.move_cache is None:
+            return self.generateValidMoves()
+        cached = self.move_cache.probe(self)
+        if cached is not None:
+            self.in_check, moves = cached
+            self.checkmate = self.in_check and len(moves) == 0
+            self.stalemate = not self.in_check and len(moves) == 0
+            return moves
+        moves = self.generateValidMoves()
+        self.move_cache.store(self, moves)
+        return moves
+
+    def generateValidMoves(self):
+        """
+        All moves considering checks, generated from the board.
         """
         temp_castle_rights = CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                           self.current_castling_rights.wqs, self.current_castling_rights.bqs)
@@ -213,7 +482,7 @@ class GameState:
                 self.getCastleMoves(self.black_king_location[0], self.black_king_location[1], moves)
 
         if len(moves) == 0:
-            if self.inCheck():
+            if self.in_check:
                 self.checkmate = True
             else:
                 # TODO stalemate on repeated moves
@@ -223,7 +492,32 @@ class GameState:
             self.stalemate = False
 
         self.current_castling_rights = temp_castle_rights
-        return moves
+        return MoveList(moves)
+
+    def isThreefoldRepetition(self):
+        """
+        The current position has occurred at least three times since the game (or the loaded FEN) started.
+        """
+        return self.zobrist_key_log.count(self.zobrist_key) >= 3
+
+    def isFiftyMoveRule(self):
+        """
+        Fifty moves by each side without a capture or pawn advance.
+        """
+        return self.halfmove_clock >= 100
+
+    def isInsufficientMaterial(self):
+        """
+        Neither side can mate: only kings left, or kings and a single bishop or knight.
+        """
+        minor_pieces = 0
+        for row in self.board:
+            for piece in row:
+                if piece[1] in "PRQ":
+                    return False
+                if piece[1] in "BN":
+                    minor_pieces += 1
+        return minor_pieces <= 1
 
     def inCheck(self):
         """
@@ -349,13 +643,13 @@ class GameState:
 
         if self.board[row + move_amount][col] == "--":  # 1 square pawn advance
             if not piece_pinned or pin_direction == (move_amount, 0):
-                moves.append(Move((row, col), (row + move_amount, col), self.board))
+                self.addPawnMove((row, col), (row + move_amount, col), moves)
                 if row == start_row and self.board[row + 2 * move_amount][col] == "--":  # 2 square pawn advance
                     moves.append(Move((row, col), (row + 2 * move_amount, col), self.board))
         if col - 1 >= 0:  # capture to the left
             if not piece_pinned or pin_direction == (move_amount, -1):
                 if self.board[row + move_amount][col - 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col - 1), self.board))
+                    self.addPawnMove((row, col), (row + move_amount, col - 1), moves)
                 if (row + move_amount, col - 1) == self.enpassant_possible:
                     attacking_piece = blocking_piece = False
                     if king_row == row:
@@ -381,7 +675,7 @@ class GameState:
         if col + 1 <= 7:  # capture to the right
             if not piece_pinned or pin_direction == (move_amount, +1):
                 if self.board[row + move_amount][col + 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col + 1), self.board))
+                    self.addPawnMove((row, col), (row + move_amount, col + 1), moves)
                 if (row + move_amount, col + 1) == self.enpassant_possible:
                     attacking_piece = blocking_piece = False
                     if king_row == row:
@@ -405,6 +699,16 @@ class GameState:
                     if not attacking_piece or blocking_piece:
                         moves.append(Move((row, col), (row + move_amount, col + 1), self.board, is_enpassant_move=True))
 
+    def addPawnMove(self, start_square, end_square, moves):
+        """
+        Add a pawn move to the list, a move to the last rank is added once for every promotion piece.
+        """
+        if end_square[0] == 0 or end_square[0] == 7:
+            for promotion_piece in Move.promotion_pieces:
+                moves.append(Move(start_square, end_square, self.board, promotion_piece=promotion_piece))
+        else:
+            moves.append(Move(start_square, end_square, self.board))
+
     def getRookMoves(self, row, col, moves):
         """
         Get all the rook moves for the rook located at row, col and add the moves to the list.
@@ -561,6 +865,12 @@ class CastleRights:
         self.wqs = wqs
         self.bqs = bqs
 
+    def index(self):
+        """
+        The four rights packed into a number from 0 to 15.
+        """
+        return self.wks | self.bks << 1 | self.wqs << 2 | self.bqs << 3
+
 
 class Move:
     # in chess, fields on the board are described by two symbols, one of them being number between 1-8 (which is corresponding to rows)
@@ -572,8 +882,10 @@ class Move:
     files_to_cols = {"a": 0, "b": 1, "c": 2, "d": 3,
                      "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
+    promotion_pieces = ("Q", "R", "B", "N")
 
-    def __init__(self, start_square, end_square, board, is_enpassant_move=False, is_castle_move=False):
+    def __init__(self, start_square, end_square, board, is_enpassant_move=False, is_castle_move=False,
+                 promotion_piece="Q"):
         self.start_row = start_square[0]
         self.start_col = start_square[1]
         self.end_row = end_square[0]
@@ -583,6 +895,7 @@ class Move:
         # pawn promotion
         self.is_pawn_promotion = (self.piece_moved == "wP" and self.end_row == 0) or (
                 self.piece_moved == "bP" and self.end_row == 7)
+        self.promotion_piece = promotion_piece if self.is_pawn_promotion else None
         # en passant
         self.is_enpassant_move = is_enpassant_move
         if self.is_enpassant_move:
@@ -592,6 +905,9 @@ class Move:
 
         self.is_capture = self.piece_captured != "--"
         self.moveID = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+        if self.is_pawn_promotion:
+            # under-promotions get their own ids, a queen promotion keeps the plain id of its squares
+            self.moveID += self.promotion_pieces.index(self.promotion_piece) * 10000
 
     def __eq__(self, other):
         """
@@ -603,9 +919,9 @@ class Move:
 
     def getChessNotation(self):
         if self.is_pawn_promotion:
-            return self.getRankFile(self.end_row, self.end_col) + "Q"
+            return self.getRankFile(self.end_row, self.end_col) + self.promotion_piece
         if self.is_castle_move:
-            if self.end_col == 1:
+            if self.end_col == 2:
                 return "0-0-0"
             else:
                 return "0-0"
@@ -624,7 +940,16 @@ class Move:
             else:
                 return self.piece_moved[1] + self.getRankFile(self.end_row, self.end_col)
 
-        # TODO Disambiguating moves
+        # disambiguation, check and mate suffixes need the position, see ChessPGN.moveToSan
+
+    def getUciNotation(self):
+        """
+        Long algebraic notation used by the UCI protocol, e.g. e2e4 or e7e8q.
+        """
+        notation = self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col)
+        if self.is_pawn_promotion:
+            notation += self.promotion_piece.lower()
+        return notation
 
     def getRankFile(self, row, col):
         return self.cols_to_files[col] + self.rows_to_ranks[row]
@@ -636,10 +961,11 @@ class Move:
         end_square = self.getRankFile(self.end_row, self.end_col)
 
         if self.piece_moved[1] == "P":
+            promotion = self.promotion_piece if self.is_pawn_promotion else ""
             if self.is_capture:
-                return self.cols_to_files[self.start_col] + "x" + end_square
+                return self.cols_to_files[self.start_col] + "x" + end_square + promotion
             else:
-                return end_square + "Q" if self.is_pawn_promotion else end_square
+                return end_square + promotion
 
         move_string = self.piece_moved[1]
         if self.is_capture:
@@ -649,6 +975,101 @@ class Move:
 
 
 
+class MoveList(list):
+    """
+    The legal moves of a position as returned by getValidMoves, with constant time lookups by square.
+    The index by start square and by (start square, end square) is built on the first lookup, so a search that
+    only loops over the moves never pays for it. Lookups assume the moves are not changed after that.
+    """
+    by_start = None  # {(row, col): [moves from the square]}
+    by_squares = None  # {(start row, start col, end row, end col): [moves], one per piece for promotions}
+
+    def buildIndex(self):
+        by_start = {}
+        by_squares = {}
+        for move in self:
+            by_start.setdefault((move.start_row, move.start_col), []).append(move)
+            by_squares.setdefault((move.start_row, move.start_col, move.end_row, move.end_col), []).append(move)
+        self.by_start = by_start
+        self.by_squares = by_squares
+
+    def movesFrom(self, square):
+        """
+        The moves of the piece on square, a (row, col) tuple.
+        """
+        if self.by_start is None:
+            self.buildIndex()
+        return self.by_start.get(square, [])
+
+    def findMove(self, start_square, end_square, promotion_piece="Q"):
+        """
+        The legal move between the squares, or None. A pawn reaching the last rank promotes to promotion_piece.
+        """
+        if self.by_squares is None:
+            self.buildIndex()
+        for move in self.by_squares.get((start_square[0], start_square[1], end_square[0], end_square[1]), ()):
+            if move.promotion_piece is None or move.promotion_piece == promotion_piece:
+                return move
+        return None
+
+
+class MoveCache:
+    """
+    Bounded cache of legal move lists keyed by the Zobrist key, which covers the side to move, the castling rights
+    and the en-passant file as well as the pieces. Direct-mapped like the transposition table, a position replaces
+    whatever was stored in its slot. Moves are kept as integer codes in an array together with the in_check flag,
+    so a hit restores the flags getValidMoves sets and builds the Moves in the order they were generated.
+    """
+    PROMOTIONS = ("Q",) + Move.promotion_pieces  # by the promotion field of a code, 0 for none
+
+    def __init__(self, size=MOVE_CACHE_SIZE):
+        self.size = 1
+        while self.size * 2 <= size:
+            self.size *= 2
+        self.entries = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+    @staticmethod
+    def encodeMove(move):
+        """
+        Start square, end square (row * 8 + col), promotion piece (1-4 for Q R B N), en passant and castle bits.
+        """
+        code = (move.start_row * 8 + move.start_col) | (move.end_row * 8 + move.end_col) << 6
+        if move.is_pawn_promotion:
+            code |= (Move.promotion_pieces.index(move.promotion_piece) + 1) << 12
+        if move.is_enpassant_move:
+            code |= 1 << 15
+        if move.is_castle_move:
+            code |= 1 << 16
+        return code
+
+    def probe(self, game_state):
+        """
+        (in_check, moves) of the position, or None if it is not cached.
+        """
+        key = game_state.zobrist_key
+        entry = self.entries[key & (self.size - 1)]
+        if entry is None or entry[0] != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        board = game_state.board
+        promotions = self.PROMOTIONS
+        moves = MoveList()
+        for code in entry[2]:
+            start = code & 63
+            end = code >> 6 & 63
+            moves.append(Move((start >> 3, start & 7), (end >> 3, end & 7), board, code >> 15 & 1 == 1,
+                              code >> 16 == 1, promotions[code >> 12 & 7]))
+        return entry[1], moves
+
+    def store(self, game_state, moves):
+        key = game_state.zobrist_key
+        self.entries[key & (self.size - 1)] = (key, game_state.in_check, array("l", map(self.encodeMove, moves)))
 
 
 # class GameState():
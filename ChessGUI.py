@@ -0,0 +1,494 @@
+"""
+Pygame front-end, started by ChessMain.
+Handling user input.
+Displaying current GameStatus object.
+This is the only module that imports pygame, the engine modules never do.
+"""
+import pygame as p
+import ChessEngine, ChessAI, ChessUCI
+import sys
+import threading
+import multiprocessing
+
+BOARD_WIDTH = BOARD_HEIGHT = 512
+MOVE_LOG_PANEL_WIDTH = 250
+MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
+DIMENSION = 8
+SQUARE_SIZE = BOARD_HEIGHT // DIMENSION
+EVENT_TIMEOUT = 1000  # ms the loop sleeps waiting for an event
+ANIMATION_FPS = 60  # the loop only runs at a fixed rate while a move is animated
+AI_MOVE_EVENT = p.USEREVENT + 1  # posted when the move finder returns a move
+MOVE_CACHE_SIZE = 1 << 10  # positions of the game whose legal moves are kept, undoing a move does not regenerate them
+IMAGES = {}
+
+
+def loadImages():
+    """
+    Initialize a global directory of images.
+    This will be called exactly once in the main.
+    """
+    pieces = ['wP', 'wR', 'wN', 'wB', 'wK', 'wQ', 'bP', 'bR', 'bN', 'bB', 'bK', 'bQ']
+    for piece in pieces:
+        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQUARE_SIZE, SQUARE_SIZE))
+
+
+def main():
+    """
+    The main driver for our code.
+    This will handle user input and updating the graphics.
+    """
+    p.init()
+    screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT))
+    clock = p.time.Clock()
+    screen.fill(p.Color("white"))
+    move_cache = ChessEngine.MoveCache(MOVE_CACHE_SIZE)
+    game_state = ChessEngine.GameState()
+    game_state.move_cache = move_cache
+    valid_moves = game_state.getValidMoves()
+    move_made = False  # flag variable for when a move is made
+    animate = False  # flag variable for when we should animate a move
+    animation = None  # the MoveAnimation being played
+    loadImages()  # do this only once before while loop
+    running = True
+    square_selected = ()  # no square is selected initially, this will keep track of the last click of the user (tuple(row,col))
+    player_clicks = []  # this will keep track of player clicks (two tuples)
+    game_over = False
+    ai_thinking = False
+    ai_request = 0  # id of the last search requested, moves of older searches are thrown away
+    move_undone = False
+    # the move finder process lives for the whole game, searches are stopped through stop_event instead of killed.
+    # It is spawned rather than forked, so it starts as a fresh headless interpreter without pygame or a display
+    context = multiprocessing.get_context("spawn")
+    request_queue = context.Queue()
+    return_queue = context.Queue()  # used to pass data between processes
+    stop_event = context.Event()
+    move_finder_process = context.Process(target=ChessAI.moveFinderWorker,
+                                          args=(request_queue, return_queue, stop_event), daemon=True)
+    move_finder_process.start()
+    threading.Thread(target=watchMoveFinder, args=(return_queue,), daemon=True).start()
+    renderer = Renderer(screen, p.font.SysFont("Arial", 14, False, False))
+    player_one = False  # if a human is playing white, then this will be True, else False
+    player_two = True  # if a hyman is playing white, then this will be True, else False
+
+    redraw = True
+    while running:
+        human_turn = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
+        if animation is None:
+            # sleep until something happens, the AI's move arrives as an event too
+            events = [p.event.wait(EVENT_TIMEOUT)] + p.event.get()
+        else:
+            clock.tick(ANIMATION_FPS)
+            events = p.event.get()
+        for e in events:
+            if e.type == p.QUIT:
+                request_queue.put(None)
+                return_queue.put(None)
+                p.quit()
+                sys.exit()
+            elif e.type == p.WINDOWEXPOSED:
+                renderer.invalidate()
+                redraw = True
+            # the move finder is done
+            elif e.type == AI_MOVE_EVENT:
+                if e.request == ai_request and ai_thinking:
+                    ai_move = ChessUCI.parseUciMove(game_state, e.move, valid_moves) if e.move is not None else None
+                    if ai_move is None:
+                        ai_move = ChessAI.findRandomMove(valid_moves)
+                    game_state.makeMove(ai_move)
+                    move_made = True
+                    animate = True
+                    ai_thinking = False
+            # scroll the move log with the mouse wheel
+            elif e.type == p.MOUSEWHEEL:
+                renderer.move_log_panel.scroll(-e.y)
+                redraw = True
+            # mouse handler, buttons 4 and 5 are the wheel
+            elif e.type == p.MOUSEBUTTONDOWN and e.button < 4:
+                if not game_over:
+                    redraw = True
+                    location = e.pos  # (x, y) location of the mouse
+                    col = location[0] // SQUARE_SIZE
+                    row = location[1] // SQUARE_SIZE
+                    if square_selected == (row, col) or col >= 8:  # user clicked the same square twice
+                        square_selected = ()  # deselect
+                        player_clicks = []  # clear clicks
+                    else:
+                        square_selected = (row, col)
+                        player_clicks.append(square_selected)  # append for both 1st and 2nd click
+                    if len(player_clicks) == 2 and human_turn:  # after 2nd click
+                        move = valid_moves.findMove(player_clicks[0], player_clicks[1])  # pawns promote to queens
+                        if move is not None:
+                            game_state.makeMove(move)
+                            move_made = True
+                            animate = True
+                            square_selected = ()  # reset user clicks
+                            player_clicks = []
+                        else:
+                            player_clicks = [square_selected]
+
+            # key handler
+            elif e.type == p.KEYDOWN:
+                redraw = True
+                if e.key == p.K_z:  # undo when 'z' is pressed
+                    game_state.undoMove()
+                    move_made = True
+                    animate = False
+                    game_over = False
+                    if ai_thinking:
+                        stop_event.set()
+                        ai_thinking = False
+                    move_undone = True
+                if e.key == p.K_r:  # reset the game when 'r' is pressed
+                    game_state = ChessEngine.GameState()
+                    game_state.move_cache = move_cache
+                    valid_moves = game_state.getValidMoves()
+                    square_selected = ()
+                    player_clicks = []
+                    move_made = False
+                    animate = False
+                    game_over = False
+                    if ai_thinking:
+                        stop_event.set()
+                        ai_thinking = False
+                    move_undone = True
+                    if animation is not None:
+                        animation = None
+                        renderer.invalidateBoard()
+
+        if move_made:
+            if animation is not None:  # cut the running animation short
+                animation = None
+                renderer.invalidateBoard()
+            if animate:
+                animation = MoveAnimation(game_state.move_log[-1], game_state.board, renderer.board_surface)
+            valid_moves = game_state.getValidMoves()
+            move_made = False
+            animate = False
+            move_undone = False
+            redraw = True
+
+        end_game_text = None
+        if game_state.checkmate:
+            game_over = True
+            if game_state.white_to_move:
+                end_game_text = "Black wins by checkmate"
+            else:
+                end_game_text = "White wins by checkmate"
+
+        elif game_state.stalemate:
+            game_over = True
+            end_game_text = "Stalemate"
+
+        # AI move finder
+        human_turn = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
+        if not game_over and not human_turn and not move_undone and not ai_thinking:
+            ai_thinking = True
+            ai_request += 1
+            request_queue.put((ai_request, game_state.packPosition()))
+
+        if animation is not None and animation.update(screen):
+            animation = None
+            renderer.invalidateBoard()
+            redraw = True
+
+        # redraw only when the state changed, the board waits for the animation to finish
+        if redraw and animation is None:
+            redraw = False
+            renderer.draw(game_state, valid_moves, square_selected, end_game_text)
+
+
+def watchMoveFinder(return_queue):
+    """
+    Runs in a thread, turns every (request id, uci move) the move finder returns into an AI_MOVE_EVENT
+    so the main loop can block on events, None ends it.
+    """
+    while True:
+        result = return_queue.get()
+        if result is None:
+            return
+        request, move = result
+        p.event.post(p.event.Event(AI_MOVE_EVENT, request=request, move=move))
+
+
+class Renderer:
+    """
+    Draws only what changed since the last frame.
+    The empty board is rendered once into board_surface, every square remembers the piece and highlights it was
+    last drawn with and is repainted only when those change. Repainted areas are collected as dirty rects and
+    pushed to the display with a single p.display.update(rects), an idle frame touches nothing.
+    """
+
+    def __init__(self, screen, move_log_font):
+        self.screen = screen
+        self.end_game_font = p.font.SysFont("Helvetica", 32, True, False)
+        self.board_surface = p.Surface((BOARD_WIDTH, BOARD_HEIGHT))
+        drawBoard(self.board_surface)
+        self.highlight_surfaces = {}
+        for color in ("green", "blue", "yellow"):
+            s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
+            s.set_alpha(100)  # transparency value 0 -> transparent, 255 -> opaque
+            s.fill(p.Color(color))
+            self.highlight_surfaces[color] = s
+        self.square_rects = [p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+                             for row in range(DIMENSION) for column in range(DIMENSION)]
+        self.move_log_panel = MoveLogPanel(p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT),
+                                           move_log_font)
+        self.dirty_rects = []
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forget what is on the screen, the next frame repaints everything.
+        """
+        self.invalidateBoard()
+        self.move_log_panel.changed = True
+        self.end_game_text = None
+        self.dirty_rects = [self.screen.get_rect()]
+
+    def invalidateBoard(self):
+        """
+        Something else drew over the board, the next frame repaints every square.
+        """
+        self.square_states = [None] * (DIMENSION * DIMENSION)
+
+    def draw(self, game_state, valid_moves, square_selected, end_game_text=None):
+        """
+        Bring the screen up to date and push the dirty rects to the display.
+        """
+        if self.end_game_text is not None and end_game_text != self.end_game_text:
+            self.invalidateBoard()  # repaint the squares under the old text
+        board_repainted = self.drawGameState(game_state, valid_moves, square_selected)
+        self.drawMoveLog(game_state)
+        # the text covers squares, so it is drawn again after any of them was repainted
+        if end_game_text is not None and (end_game_text != self.end_game_text or board_repainted):
+            self.dirty_rects.append(drawEndGameText(self.screen, end_game_text, self.end_game_font))
+        self.end_game_text = end_game_text
+        self.flush()
+
+    def drawGameState(self, game_state, valid_moves, square_selected):
+        """
+        Repaint the squares whose piece or highlights changed, returns True if any was repainted.
+        """
+        highlights = self.squareHighlights(game_state, valid_moves, square_selected)
+        repainted = False
+        for row in range(DIMENSION):
+            for column in range(DIMENSION):
+                square = row * DIMENSION + column
+                state = (game_state.board[row][column], highlights.get(square, ()))
+                if state == self.square_states[square]:
+                    continue
+                self.square_states[square] = state
+                self.drawSquare(square, state)
+                repainted = True
+        return repainted
+
+    def squareHighlights(self, game_state, valid_moves, square_selected):
+        """
+        {square: highlight colors in drawing order} for the last move, the selected piece and its moves.
+        """
+        highlights = {}
+        if (len(game_state.move_log)) > 0:
+            last_move = game_state.move_log[-1]
+            highlights[last_move.end_row * DIMENSION + last_move.end_col] = ("green",)
+        if square_selected != ():
+            row, col = square_selected
+            if game_state.board[row][col][0] == (
+                    'w' if game_state.white_to_move else 'b'):  # square_selected is a piece that can be moved
+                square = row * DIMENSION + col
+                highlights[square] = highlights.get(square, ()) + ("blue",)
+                for move in valid_moves.movesFrom(square_selected):
+                    square = move.end_row * DIMENSION + move.end_col
+                    if "yellow" not in highlights.get(square, ()):  # the promotions of a pawn share their square
+                        highlights[square] = highlights.get(square, ()) + ("yellow",)
+        return highlights
+
+    def drawSquare(self, square, state):
+        piece, highlights = state
+        rect = self.square_rects[square]
+        self.screen.blit(self.board_surface, rect, rect)
+        for color in highlights:
+            self.screen.blit(self.highlight_surfaces[color], rect)
+        if piece != "--":
+            self.screen.blit(IMAGES[piece], rect)
+        self.dirty_rects.append(rect)
+
+    def drawMoveLog(self, game_state):
+        self.move_log_panel.update(game_state.move_log)
+        rect = self.move_log_panel.draw(self.screen)
+        if rect is not None:
+            self.dirty_rects.append(rect)
+
+    def flush(self):
+        """
+        Push the dirty rects to the display.
+        """
+        if self.dirty_rects:
+            p.display.update(self.dirty_rects)
+            self.dirty_rects = []
+
+
+def drawBoard(screen):
+    """
+    Draw the squares on the board.
+    The top left square is always light.
+    """
+    global colors
+    colors = [p.Color("white"), p.Color("gray")]
+    for row in range(DIMENSION):
+        for column in range(DIMENSION):
+            color = colors[((row + column) % 2)]
+            p.draw.rect(screen, color, p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+
+def drawPieces(screen, board):
+    """
+    Draw the pieces on the board using the current game_state.board
+    """
+    for row in range(DIMENSION):
+        for column in range(DIMENSION):
+            piece = board[row][column]
+            if piece != "--":
+                screen.blit(IMAGES[piece], p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+
+class MoveLogPanel:
+    """
+    Move log with one cached text surface per line.
+    Only the lines from the first move that changed are rendered again, which after a move or an undo is
+    just the last line, so drawing the panel costs the same however long the game is.
+    The panel follows the newest moves until it is scrolled up.
+    """
+    moves_per_row = 3
+    padding = 5
+    line_spacing = 2
+
+    def __init__(self, rect, font):
+        self.rect = rect
+        self.font = font
+        self.moves = []  # the moves the cached lines were rendered from
+        self.lines = []
+        self.line_height = font.get_linesize() + self.line_spacing
+        self.visible_lines = max(1, (rect.height - 2 * self.padding) // self.line_height)
+        self.first_line = 0  # first line shown
+        self.follow = True  # keep the last line in view
+        self.changed = True
+
+    def update(self, move_log):
+        """
+        Bring the cached lines up to date with the move log.
+        """
+        moves = self.moves
+        if len(moves) == len(move_log) and (not moves or moves[-1] is move_log[-1]):
+            return
+        same = min(len(moves), len(move_log))
+        while same > 0 and moves[same - 1] is not move_log[same - 1]:
+            same -= 1
+        del moves[same:]
+        moves.extend(move_log[same:])
+        plies_per_line = 2 * self.moves_per_row
+        first_changed = same // plies_per_line
+        del self.lines[first_changed:]
+        for line in range(first_changed, (len(moves) + plies_per_line - 1) // plies_per_line):
+            self.lines.append(self.renderLine(line))
+        self.scrollTo(self.lastFirstLine() if self.follow else self.first_line)
+        self.changed = True
+
+    def renderLine(self, line):
+        text = ""
+        for i in range(line * 2 * self.moves_per_row, min((line + 1) * 2 * self.moves_per_row, len(self.moves)), 2):
+            text += str(i // 2 + 1) + '. ' + str(self.moves[i]) + " "
+            if i + 1 < len(self.moves):
+                text += str(self.moves[i + 1]) + "  "
+        return self.font.render(text, True, p.Color('white'))
+
+    def lastFirstLine(self):
+        return max(0, len(self.lines) - self.visible_lines)
+
+    def scrollTo(self, first_line):
+        first_line = min(max(first_line, 0), self.lastFirstLine())
+        if first_line != self.first_line:
+            self.first_line = first_line
+            self.changed = True
+        self.follow = first_line == self.lastFirstLine()
+
+    def scroll(self, lines):
+        self.scrollTo(self.first_line + lines)
+
+    def draw(self, screen):
+        """
+        Draw the visible lines if anything changed, returns the dirty rect or None.
+        """
+        if not self.changed:
+            return None
+        self.changed = False
+        p.draw.rect(screen, p.Color('black'), self.rect)
+        text_y = self.rect.top + self.padding
+        for line in self.lines[self.first_line:self.first_line + self.visible_lines]:
+            screen.blit(line, (self.rect.left + self.padding, text_y))
+            text_y += self.line_height
+        return self.rect
+
+
+def drawEndGameText(screen, text, font):
+    """
+    Returns the rect covered by the text.
+    """
+    text_object = font.render(text, False, p.Color("gray"))
+    text_location = p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT).move(BOARD_WIDTH / 2 - text_object.get_width() / 2,
+                                                                 BOARD_HEIGHT / 2 - text_object.get_height() / 2)
+    screen.blit(text_object, text_location)
+    text_object = font.render(text, False, p.Color('black'))
+    screen.blit(text_object, text_location.move(2, 2))
+    return p.Rect(text_location.topleft, (text_object.get_width() + 2, text_object.get_height() + 2))
+
+
+class MoveAnimation:
+    """
+    Non-blocking animation of a move, the main loop advances it once per frame and keeps handling input meanwhile.
+    The board after the move without the moving piece is rendered once into a snapshot, every frame only
+    restores the rect the piece covered from the snapshot and blits the piece at its new place.
+    """
+    frames_per_square = 10  # frames to move one square
+
+    def __init__(self, move, board, board_surface):
+        self.move = move
+        self.snapshot = board_surface.copy()
+        drawPieces(self.snapshot, board)
+        # erase the piece moved from its ending square
+        end_square = p.Rect(move.end_col * SQUARE_SIZE, move.end_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+        self.snapshot.blit(board_surface, end_square, end_square)
+        # draw captured piece onto rectangle
+        if move.piece_captured != '--':
+            if move.is_enpassant_move:
+                enpassant_row = move.end_row + 1 if move.piece_captured[0] == 'b' else move.end_row - 1
+                end_square = p.Rect(move.end_col * SQUARE_SIZE, enpassant_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+            self.snapshot.blit(IMAGES[move.piece_captured], end_square)
+        self.d_row = move.end_row - move.start_row
+        self.d_col = move.end_col - move.start_col
+        frame_count = (abs(self.d_row) + abs(self.d_col)) * self.frames_per_square
+        self.duration = frame_count * 1000 / ANIMATION_FPS  # ms
+        self.start_time = None
+        self.piece_rect = None
+
+    def update(self, screen):
+        """
+        Draw the next frame, returns True when the animation is over.
+        """
+        now = p.time.get_ticks()
+        if self.start_time is None:
+            self.start_time = now
+            screen.blit(self.snapshot, (0, 0))
+            dirty_rects = [self.snapshot.get_rect()]
+        else:
+            screen.blit(self.snapshot, self.piece_rect, self.piece_rect)
+            dirty_rects = [self.piece_rect]
+        progress = min((now - self.start_time) / self.duration, 1) if self.duration > 0 else 1
+        if progress >= 1:
+            return True  # the renderer draws the final position
+        row = self.move.start_row + self.d_row * progress
+        col = self.move.start_col + self.d_col * progress
+        self.piece_rect = p.Rect(round(col * SQUARE_SIZE), round(row * SQUARE_SIZE), SQUARE_SIZE, SQUARE_SIZE)
+        screen.blit(IMAGES[self.move.piece_moved], self.piece_rect)
+        dirty_rects.append(self.piece_rect)
+        p.display.update(dirty_rects)
+        return False
@@ -0,0 +1,80 @@
+"""
+Load generator for ChessServer.
+Opens many connections, plays random legal moves against the engine in every game at once,
+then prints the round trip latencies it measured and the server's own metrics.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import ChessEngine
+import ChessServer
+
+
+async def request(reader, writer, message):
+    writer.write((json.dumps(message) + "\n").encode())
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def playGame(host, port, moves_per_game, game_time, latencies, rng):
+    """
+    Play one game of random human moves, recording how long each engine reply took.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        color = rng.choice("wb")
+        reply = await request(reader, writer, {"cmd": "new", "color": color, "time": game_time})
+        game_id = reply["game"]
+        game_state = ChessEngine.GameState()
+        game_state.loadFen(reply["fen"])
+        for _ in range(moves_per_game):
+            if reply["status"] != "ongoing":
+                break
+            valid_moves = game_state.getValidMoves()
+            move = rng.choice(valid_moves)
+            start_time = time.time()
+            reply = await request(reader, writer, {"cmd": "move", "game": game_id, "move": move.getUciNotation()})
+            latencies.append(time.time() - start_time)
+            if not reply["ok"]:
+                break
+            game_state.loadFen(reply["fen"])
+        await request(reader, writer, {"cmd": "close", "game": game_id})
+    finally:
+        writer.close()
+
+
+async def runLoad(host, port, games, moves_per_game, game_time, seed):
+    rng = random.Random(seed)
+    latencies = []
+    start_time = time.time()
+    await asyncio.gather(*(playGame(host, port, moves_per_game, game_time, latencies, random.Random(rng.random()))
+                           for _ in range(games)))
+    elapsed = time.time() - start_time
+    reader, writer = await asyncio.open_connection(host, port)
+    metrics = (await request(reader, writer, {"cmd": "metrics"}))["metrics"]
+    writer.close()
+
+    print("games", games, "moves", len(latencies), "seconds", round(elapsed, 2),
+          "moves/s", round(len(latencies) / elapsed, 2) if elapsed > 0 else 0)
+    for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        print("round trip", name, round(ChessServer.percentile(latencies, fraction) * 1000), "ms")
+    for name, value in metrics.items():
+        print(name, round(value, 4) if isinstance(value, float) else value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChessServer with many concurrent random games.")
+    parser.add_argument("--host", default=ChessServer.HOST)
+    parser.add_argument("--port", type=int, default=ChessServer.PORT)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--moves", type=int, default=10, help="human moves per game")
+    parser.add_argument("--time", type=float, default=10, help="engine budget per game in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(runLoad(args.host, args.port, args.games, args.moves, args.time, args.seed))
+
+
+if __name__ == "__main__":
+    main()
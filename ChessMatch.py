@@ -0,0 +1,268 @@
+"""
+Self-play match runner.
+Plays many games between two ChessAI configurations in parallel, every opening from the FEN file is played
+twice with colors swapped. The search is deterministic, so every pair of games needs an opening of its own:
+repeated openings are dropped and missing ones are made by playing a few seeded random moves from the given ones.
+Prints wins/losses/draws of the first engine, the Elo difference with a 95% error
+margin and an SPRT verdict, and streams every finished game to a PGN file.
+    python ChessMatch.py --engine1 depth=3 --engine2 depth=2 --openings openings.fen --games 200 --pgn match.pgn
+"""
+import argparse
+import datetime
+import math
+import multiprocessing
+import random
+import ChessEngine
+import ChessAI
+import ChessPGN
+
+MAX_PLIES = 300  # longer games are adjudicated as draws
+RANDOM_PLIES = 4  # random moves played from a given opening to make up a missing one
+DEFAULT_ENGINE = {"depth": ChessAI.DEPTH, "time": None, "nodes": None, "rich": True}
+
+
+def parseEngine(text, name):
+    """
+    Engine configuration from a comma separated list like "depth=3,time=0.5,nodes=20000,rich=0".
+    """
+    engine = dict(DEFAULT_ENGINE, name=name)
+    for item in text.split(","):
+        if not item:
+            continue
+        key, value = item.split("=")
+        if key == "name":
+            engine["name"] = value
+        elif key == "depth" or key == "nodes":
+            engine[key] = int(value)
+        elif key == "time":
+            engine["time"] = float(value)
+        elif key == "rich":
+            engine["rich"] = value.lower() in ("1", "true", "yes")
+        else:
+            raise ValueError("Unknown engine option " + key)
+    return engine
+
+
+def loadOpenings(path):
+    """
+    One FEN per line, empty lines and lines starting with # are skipped.
+    """
+    if path is None:
+        return [ChessEngine.STARTING_FEN]
+    with open(path) as file:
+        openings = [line.strip() for line in file if line.strip() and not line.startswith("#")]
+    return openings or [ChessEngine.STARTING_FEN]
+
+
+def prepareOpenings(openings, games, seed=0):
+    """
+    Distinct openings for games / 2 color-swapped pairs. Openings of the same position are dropped with a warning,
+    if too few are left the rest are found by playing RANDOM_PLIES random legal moves from them.
+    """
+    def positionKey(fen):
+        return " ".join(fen.split()[:4])  # the move counters do not change the game
+
+    keys = set()
+    unique = []
+    for fen in openings:
+        if positionKey(fen) not in keys:
+            keys.add(positionKey(fen))
+            unique.append(fen)
+    if len(unique) < len(openings):
+        print("Warning: dropped " + str(len(openings) - len(unique)) + " repeated openings")
+    needed = (games + 1) // 2
+    rng = random.Random(seed)
+    base = list(unique)
+    attempts = 0
+    while len(unique) < needed and attempts < needed * 100:
+        attempts += 1
+        game_state = ChessEngine.GameState()
+        game_state.loadFen(rng.choice(base))
+        for _ in range(RANDOM_PLIES):
+            valid_moves = game_state.getValidMoves()
+            if len(valid_moves) == 0:
+                break
+            game_state.makeMove(rng.choice(valid_moves))
+        fen = game_state.getFen()
+        if len(game_state.getValidMoves()) > 0 and positionKey(fen) not in keys:
+            keys.add(positionKey(fen))
+            unique.append(fen)
+    if len(unique) < needed:
+        print("Warning: only " + str(len(unique)) + " distinct openings for " + str(needed) +
+              " pairs of games, games will repeat")
+    return unique
+
+
+class EngineCaches:
+    """
+    Every engine of a match keeps its own transposition table and evaluation caches,
+    swapped into ChessAI before it moves, so the two configurations never share results.
+    """
+
+    def __init__(self):
+        self.transposition_table = ChessAI.TranspositionTable()
+        self.eval_cache = [None] * ChessAI.EVAL_CACHE_SIZE
+        self.pawn_hash_table = [None] * ChessAI.PAWN_HASH_SIZE
+
+    def install(self, engine):
+        ChessAI.transposition_table = self.transposition_table
+        ChessAI.eval_cache = self.eval_cache
+        ChessAI.pawn_hash_table = self.pawn_hash_table
+        ChessAI.RICH_EVALUATION = engine["rich"]
+
+
+def adjudicate(game_state, valid_moves):
+    """
+    Result of the game as a PGN result string and the reason, or None while the game goes on.
+    """
+    if len(valid_moves) == 0:
+        if game_state.checkmate:
+            return ("0-1" if game_state.white_to_move else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if game_state.isThreefoldRepetition():
+        return "1/2-1/2", "repetition"
+    if game_state.isFiftyMoveRule():
+        return "1/2-1/2", "fifty moves"
+    if game_state.isInsufficientMaterial():
+        return "1/2-1/2", "insufficient material"
+    if len(game_state.move_log) >= MAX_PLIES:
+        return "1/2-1/2", "move limit"
+    return None
+
+
+def playGame(task):
+    """
+    Runs in a pool process: play one game, returns a dict with the result seen from engine 1 and the PGN text.
+    """
+    game_number, opening, engine1, engine2, engine1_white = task
+    white, black = (engine1, engine2) if engine1_white else (engine2, engine1)
+    caches = {id(white): EngineCaches(), id(black): EngineCaches()}
+    game_state = ChessEngine.GameState()
+    game_state.loadFen(opening)
+    while True:
+        valid_moves = game_state.getValidMoves()
+        outcome = adjudicate(game_state, valid_moves)
+        if outcome is not None:
+            break
+        engine = white if game_state.white_to_move else black
+        caches[id(engine)].install(engine)
+        move, score = ChessAI.searchPosition(game_state, valid_moves, max_depth=engine["depth"],
+                                             time_limit=engine["time"], max_nodes=engine["nodes"])
+        game_state.makeMove(move)
+    result, reason = outcome
+    if result == "1/2-1/2":
+        points = 0.5
+    else:
+        points = 1.0 if (result == "1-0") == engine1_white else 0.0
+    return {"points": points, "result": result, "reason": reason,
+            "pgn": formatPgn(game_state, opening, white["name"], black["name"], result, reason, game_number)}
+
+
+def formatPgn(game_state, opening, white_name, black_name, result, reason, round_number):
+    headers = {"Event": "Self-play match", "Site": "local", "Date": datetime.date.today().strftime("%Y.%m.%d"),
+               "Round": str(round_number), "White": white_name, "Black": black_name, "Termination": reason}
+    return ChessPGN.formatGame(game_state.move_log, headers, opening, result)
+
+
+def eloDifference(wins, losses, draws):
+    """
+    Elo difference of engine 1 and its 95% error margin, from the score fraction and its standard error.
+    """
+    games = wins + losses + draws
+    if games == 0:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+
+    def elo(fraction):
+        fraction = min(max(fraction, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / fraction - 1)
+
+    return elo(score), (elo(score + margin) - elo(score - margin)) / 2
+
+
+def sprt(wins, losses, draws, elo0, elo1, alpha, beta):
+    """
+    Sequential probability ratio test of H0: elo = elo0 against H1: elo = elo1.
+    Uses the normal approximation of the log-likelihood ratio, returns (llr, lower bound, upper bound, verdict).
+    """
+    lower = math.log(beta / (1 - alpha))
+    upper = math.log((1 - beta) / alpha)
+    games = wins + losses + draws
+    if games == 0 or wins + losses == 0:
+        return 0.0, lower, upper, "continue"
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0, lower, upper, "continue"
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    llr = games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+    if llr >= upper:
+        verdict = "H1 accepted (engine 1 is stronger by at least elo1)"
+    elif llr <= lower:
+        verdict = "H0 accepted (engine 1 is not stronger by elo1)"
+    else:
+        verdict = "continue"
+    return llr, lower, upper, verdict
+
+
+def runMatch(engine1, engine2, openings, games, processes, pgn_path, elo0, elo1, alpha, beta):
+    tasks = []
+    for game_number in range(games):
+        opening = openings[(game_number // 2) % len(openings)]
+        tasks.append((game_number + 1, opening, engine1, engine2, game_number % 2 == 0))
+    wins = losses = draws = 0
+    reasons = {}
+    pgn_file = open(pgn_path, "w") if pgn_path else None
+    try:
+        with multiprocessing.Pool(processes) as pool:
+            for game in pool.imap_unordered(playGame, tasks):
+                if game["points"] == 1:
+                    wins += 1
+                elif game["points"] == 0:
+                    losses += 1
+                else:
+                    draws += 1
+                reasons[game["reason"]] = reasons.get(game["reason"], 0) + 1
+                if pgn_file is not None:
+                    pgn_file.write(game["pgn"])
+                    pgn_file.flush()
+                print("Games " + str(wins + losses + draws) + ": +" + str(wins) + " -" + str(losses) + " =" +
+                      str(draws), flush=True)
+    finally:
+        if pgn_file is not None:
+            pgn_file.close()
+
+    elo, margin = eloDifference(wins, losses, draws)
+    llr, lower, upper, verdict = sprt(wins, losses, draws, elo0, elo1, alpha, beta)
+    print(engine1["name"] + " vs " + engine2["name"] + ": +" + str(wins) + " -" + str(losses) + " =" + str(draws))
+    print("Elo difference: %.1f +/- %.1f" % (elo, margin))
+    print("SPRT elo0=%g elo1=%g alpha=%g beta=%g: LLR %.2f [%.2f, %.2f] %s" % (elo0, elo1, alpha, beta, llr,
+                                                                                 lower, upper, verdict))
+    print("Terminations: " + ", ".join(reason + " " + str(count) for reason, count in sorted(reasons.items())))
+    return wins, losses, draws
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play two ChessAI configurations against each other.")
+    parser.add_argument("--engine1", default="", help="e.g. depth=3,time=1,nodes=50000,rich=1,name=new")
+    parser.add_argument("--engine2", default="", help="same options as --engine1")
+    parser.add_argument("--openings", help="file with one FEN per line, default is the starting position")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random moves that make up missing openings")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--pgn", help="file the games are written to")
+    parser.add_argument("--elo0", type=float, default=0)
+    parser.add_argument("--elo1", type=float, default=10)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    args = parser.parse_args()
+    openings = prepareOpenings(loadOpenings(args.openings), args.games, args.seed)
+    runMatch(parseEngine(args.engine1, "engine1"), parseEngine(args.engine2, "engine2"), openings, args.games,
+             args.processes, args.pgn, args.elo0, args.elo1, args.alpha, args.beta)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Reading and writing PGN.
+readGames streams a PGN file of any size one game at a time, only the game being read is kept in memory.
+parseSan turns standard algebraic notation into a legal Move, moveToSan writes fully disambiguated SAN
+with check and mate suffixes, formatGame writes a whole game.
+"""
+import re
+import ChessEngine
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+HEADER_PATTERN = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_PATTERN = re.compile(r'\{|\}|\(|\)|;|\$\d+|[^\s{}();]+')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+')
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+class PgnGame:
+    """
+    One game read from a PGN file: its tag pairs, its main line moves in SAN and its result.
+    """
+
+    def __init__(self, headers, san_moves, result):
+        self.headers = headers
+        self.san_moves = san_moves
+        self.result = result
+
+    def startingFen(self):
+        return self.headers.get("FEN", ChessEngine.STARTING_FEN)
+
+    def replay(self):
+        """
+        Play the game through a GameState, yields (game state, move) before each move is made.
+        Raises ValueError on a move that is not legal in the position.
+        """
+        game_state = ChessEngine.GameState()
+        game_state.loadFen(self.startingFen())
+        for san in self.san_moves:
+            move = parseSan(game_state, san)
+            if move is None:
+                raise ValueError("Illegal move " + san + " in position " + game_state.getFen())
+            yield game_state, move
+            game_state.makeMove(move)
+
+
+def readGames(lines):
+    """
+    Generator of PgnGames from an iterable of lines, e.g. an open file.
+    Comments, variations, NAGs and move numbers are skipped, so san_moves is the main line only.
+    """
+    headers = {}
+    san_moves = []
+    in_movetext = False
+    brace_comment = False
+    variation_depth = 0
+    for line in lines:
+        if brace_comment:
+            end = line.find("}")
+            if end < 0:
+                continue
+            line = line[end + 1:]
+            brace_comment = False
+        elif line.startswith("%"):
+            continue  # escape line
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith("[") and variation_depth == 0:
+            match = HEADER_PATTERN.match(stripped)
+            if match:
+                if in_movetext:
+                    # a new game started without a result token in the previous one
+                    yield PgnGame(headers, san_moves, headers.get("Result", "*"))
+                    headers = {}
+                    san_moves = []
+                    in_movetext = False
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+        in_movetext = True
+        for token in TOKEN_PATTERN.findall(line):
+            if brace_comment:
+                if token == "}":
+                    brace_comment = False
+                continue
+            if token == "{":
+                brace_comment = True
+            elif token == ";":
+                break  # comment to the end of the line
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(variation_depth - 1, 0)
+            elif variation_depth > 0 or token.startswith("$"):
+                continue
+            elif token in RESULTS:
+                yield PgnGame(headers, san_moves, token)
+                headers = {}
+                san_moves = []
+                in_movetext = False
+            else:
+                token = MOVE_NUMBER_PATTERN.sub("", token)
+                if token:
+                    san_moves.append(token)
+    if in_movetext or headers:
+        yield PgnGame(headers, san_moves, headers.get("Result", "*"))
+
+
+def readGamesFromFile(path):
+    """
+    Generator of the PgnGames in the file at path.
+    """
+    with open(path, encoding="utf-8", errors="replace") as file:
+        for game in readGames(file):
+            yield game
+
+
+def parseSan(game_state, san, valid_moves=None):
+    """
+    Find the legal move written in SAN (e.g. e4, Nbd7, exd5, e8=Q+, O-O), returns None if there is none.
+    """
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(san) == 3 else 2
+        for move in valid_moves:
+            if move.is_castle_move and move.end_col == end_col:
+                return move
+        return None
+    match = SAN_PATTERN.match(san)
+    if match is None:
+        return None
+    piece_type, from_file, from_rank, to_square, promotion = match.groups()
+    piece_type = piece_type or "P"
+    end_row = ChessEngine.Move.ranks_to_rows[to_square[1]]
+    end_col = ChessEngine.Move.files_to_cols[to_square[0]]
+    found = None
+    for move in valid_moves:
+        if move.end_row != end_row or move.end_col != end_col or move.piece_moved[1] != piece_type:
+            continue
+        if from_file is not None and move.start_col != ChessEngine.Move.files_to_cols[from_file]:
+            continue
+        if from_rank is not None and move.start_row != ChessEngine.Move.ranks_to_rows[from_rank]:
+            continue
+        if move.is_pawn_promotion and move.promotion_piece != (promotion or "Q"):
+            continue
+        if found is not None:
+            return None  # ambiguous
+        found = move
+    return found
+
+
+def moveToSan(game_state, move, valid_moves=None):
+    """
+    SAN of a legal move in the current position, disambiguated by file, rank or both as needed,
+    with + for check and # for mate.
+    """
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    if move.is_castle_move:
+        san = "O-O" if move.end_col == 6 else "O-O-O"
+    else:
+        end_square = move.getRankFile(move.end_row, move.end_col)
+        piece_type = move.piece_moved[1]
+        if piece_type == "P":
+            san = (move.cols_to_files[move.start_col] + "x" if move.is_capture else "") + end_square
+            if move.is_pawn_promotion:
+                san += "=" + move.promotion_piece
+        else:
+            same_file = same_rank = ambiguous = False
+            for other in valid_moves:
+                if other.piece_moved == move.piece_moved and other.end_row == move.end_row and \
+                        other.end_col == move.end_col and (other.start_row, other.start_col) != (
+                        move.start_row, move.start_col):
+                    ambiguous = True
+                    if other.start_col == move.start_col:
+                        same_file = True
+                    if other.start_row == move.start_row:
+                        same_rank = True
+            disambiguation = ""
+            if ambiguous:
+                if not same_file:
+                    disambiguation = move.cols_to_files[move.start_col]
+                elif not same_rank:
+                    disambiguation = move.rows_to_ranks[move.start_row]
+                else:
+                    disambiguation = move.getRankFile(move.start_row, move.start_col)
+            san = piece_type + disambiguation + ("x" if move.is_capture else "") + end_square
+    game_state.makeMove(move)
+    replies = game_state.getValidMoves()
+    if game_state.in_check:
+        san += "#" if len(replies) == 0 else "+"
+    game_state.undoMove()
+    game_state.getValidMoves()  # restore the flags of the position
+    return san
+
+
+def formatGame(moves, headers=None, start_fen=ChessEngine.STARTING_FEN, result="*"):
+    """
+    PGN text of a game given as a list of Moves played from start_fen.
+    The seven tag roster comes first, missing tags are filled with "?", SetUp and FEN are added for other starts.
+    """
+    headers = dict(headers or {})
+    headers["Result"] = result
+    if start_fen != ChessEngine.STARTING_FEN:
+        headers["SetUp"] = "1"
+        headers["FEN"] = start_fen
+    lines = []
+    for name in SEVEN_TAG_ROSTER:
+        lines.append(formatHeader(name, headers.get(name, "?")))
+    for name, value in headers.items():
+        if name not in SEVEN_TAG_ROSTER:
+            lines.append(formatHeader(name, value))
+
+    game_state = ChessEngine.GameState()
+    game_state.loadFen(start_fen)
+    tokens = []
+    for i, move in enumerate(moves):
+        if game_state.white_to_move:
+            tokens.append(str(game_state.fullmove_number) + ".")
+        elif i == 0:
+            tokens.append(str(game_state.fullmove_number) + "...")
+        tokens.append(moveToSan(game_state, move))
+        game_state.makeMove(move)
+    tokens.append(result)
+    return "\n".join(lines) + "\n\n" + wrapTokens(tokens) + "\n\n"
+
+
+def formatHeader(name, value):
+    return "[" + name + ' "' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"]'
+
+
+def wrapTokens(tokens, width=80):
+    """
+    Join movetext tokens into lines of at most width characters.
+    """
+    lines = []
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+"""
+Hot path profiler for the engine.
+While enabled, the functions in HOT_PATHS are replaced by wrappers that count calls and measure inclusive and
+self time, and the self time of every call stack is collected for a flamegraph (collapsed stacks, one
+"a;b;c microseconds" line per stack, as read by flamegraph.pl or speedscope). Disabled, the original functions
+are put back, so the profiler costs nothing when it is off.
+    python ChessProfiler.py --depth 2 --collapsed search.folded
+"""
+import argparse
+import time
+import ChessEngine
+import ChessAI
+import ChessBench
+
+HOT_PATHS = ((ChessAI, "searchPosition"), (ChessAI, "findMoveNegaMaxAlphaBeta"), (ChessAI, "scoreBoard"),
+             (ChessEngine.GameState, "getValidMoves"), (ChessEngine.GameState, "generateValidMoves"),
+             (ChessEngine.MoveCache, "probe"), (ChessEngine.GameState, "checkForPinsAndChecks"),
+             (ChessEngine.GameState, "getAllPossibleMoves"), (ChessEngine.GameState, "getPawnMoves"),
+             (ChessEngine.GameState, "makeMove"), (ChessEngine.GameState, "undoMove"))
+
+
+class Profiler:
+    """
+    Call counts and times of the hot paths, collected between enable() and disable().
+    """
+
+    def __init__(self, hot_paths=HOT_PATHS):
+        self.hot_paths = hot_paths
+        self.originals = {}
+        self.stats = {}  # name: [calls, inclusive seconds, self seconds]
+        self.stacks = {}  # "outer;inner": self seconds
+        self.frames = []  # [name, start time, time spent in profiled callees] of the calls in progress
+
+    def enable(self):
+        for owner, name in self.hot_paths:
+            if (owner, name) not in self.originals:
+                self.originals[(owner, name)] = getattr(owner, name)
+                setattr(owner, name, self.wrap(name, getattr(owner, name)))
+
+    def disable(self):
+        for (owner, name), function in self.originals.items():
+            setattr(owner, name, function)
+        self.originals = {}
+
+    def wrap(self, name, function):
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+        frames = self.frames
+        perf_counter = time.perf_counter
+
+        def profiled(*args, **kwargs):
+            frame = [name, perf_counter(), 0.0]
+            frames.append(frame)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - frame[1]
+                frames.pop()
+                stats[0] += 1
+                stats[2] += elapsed - frame[2]
+                if all(outer[0] != name for outer in frames):
+                    stats[1] += elapsed  # recursive calls are inside the outermost one
+                if frames:
+                    frames[-1][2] += elapsed
+                stack = ";".join([outer[0] for outer in frames] + [name])
+                self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - frame[2]
+
+        profiled.__name__ = function.__name__
+        profiled.__doc__ = function.__doc__
+        return profiled
+
+    def report(self):
+        """
+        Lines of calls, inclusive and self time per function, most self time first.
+        """
+        total = sum(stats[2] for stats in self.stats.values()) or 1
+        lines = ["%-28s %10s %10s %10s %7s" % ("function", "calls", "total ms", "self ms", "self %")]
+        for name, (calls, inclusive, exclusive) in sorted(self.stats.items(), key=lambda item: -item[1][2]):
+            if calls:
+                lines.append("%-28s %10d %10.1f %10.1f %6.1f%%" % (name, calls, inclusive * 1000, exclusive * 1000,
+                                                                   exclusive * 100 / total))
+        return "\n".join(lines)
+
+    def writeCollapsed(self, path):
+        with open(path, "w") as file:
+            for stack, seconds in sorted(self.stacks.items()):
+                file.write(stack + " " + str(int(seconds * 1000000)) + "\n")
+
+
+def refreshMoveFunctions(game_state):
+    """
+    GameState keeps its move functions as bound methods, rebind them to the class's current (profiled or not) ones.
+    """
+    game_state.moveFunctions = {"P": game_state.getPawnMoves, "R": game_state.getRookMoves,
+                                "N": game_state.getKnightMoves, "B": game_state.getBishopMoves,
+                                "Q": game_state.getQueenMoves, "K": game_state.getKingMoves}
+
+
+def profilePositions(fens, depth, profiler=None):
+    """
+    Search every position to depth with the profiler enabled, returns the profiler.
+    Every search starts from empty caches as in ChessBench.runBench, so profiles do not depend on what ran before.
+    """
+    profiler = profiler or Profiler()
+    analysis_cache = ChessAI.analysis_cache
+    ChessAI.analysis_cache = None  # stored results would skip searches
+    profiler.enable()
+    try:
+        for fen in fens:
+            game_state = ChessEngine.GameState()
+            game_state.loadFen(fen)
+            refreshMoveFunctions(game_state)
+            ChessAI.transposition_table.clear()
+            ChessAI.clearEvalCache()
+            ChessAI.move_cache.clear()
+            ChessAI.searchPosition(game_state, max_depth=depth)
+    finally:
+        profiler.disable()
+        ChessAI.analysis_cache = analysis_cache
+    return profiler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the engine's hot paths on fixed positions.")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fen", action="append", help="position to profile instead of the bench positions")
+    parser.add_argument("--collapsed", help="write collapsed stacks for a flamegraph to this file")
+    args = parser.parse_args()
+    profiler = profilePositions(args.fen or ChessBench.BENCH_POSITIONS, args.depth)
+    print(profiler.report())
+    if args.collapsed:
+        profiler.writeCollapsed(args.collapsed)
+
+
+if __name__ == "__main__":
+    main()
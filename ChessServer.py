@@ -0,0 +1,290 @@
+"""
+Asyncio game server hosting many human vs engine games at once.
+Clients connect over local TCP and talk in JSON lines, one request and one reply per line:
+    {"cmd": "new", "color": "w", "time": 60}          start a game, color is the human's, time the engine's budget
+    {"cmd": "move", "game": 1, "move": "e2e4"}         play a move, the reply carries the engine's answer
+    {"cmd": "close", "game": 1}                        forget a game
+    {"cmd": "metrics"}                                 queue depth, search latency percentiles and counters
+Games live in memory as GameStates, searches run in a bounded process pool and are scheduled first come
+first served with at most one search per game in the queue, so a busy game can't starve the others.
+All pool workers search with one SharedTranspositionTable, so what one worker learned about a position
+is there for the others, and with --analysis-cache finished searches are also kept on disk across restarts.
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import ChessEngine
+import ChessAI
+import ChessUCI
+
+HOST = "127.0.0.1"
+PORT = 8765
+WORKERS = 4
+GAME_TIME = 60  # default engine thinking budget per game in seconds
+MOVES_TO_GO = 30  # moves the remaining budget is split over
+MAX_MOVE_TIME = 5  # seconds, upper bound for a single search
+MIN_MOVE_TIME = 0.05
+LATENCY_SAMPLES = 1000  # latencies kept for the percentiles
+
+
+def searchWorker(packed_position, time_limit, max_depth):
+    """
+    Runs in a pool process: search the position (GameState.packPosition) and return (uci move, score, nodes, seconds).
+    """
+    game_state = ChessEngine.GameState()
+    game_state.loadPackedPosition(packed_position)
+    start_time = time.time()
+    move, score = ChessAI.searchPosition(game_state, max_depth=max_depth, time_limit=time_limit)
+    return (move.getUciNotation() if move is not None else None, score, ChessAI.search_stats["nodes"],
+            time.time() - start_time)
+
+
+def initWorker(table_name, analysis_cache_path, analysis_cache_mb):
+    """
+    Pool initializer: attach the shared transposition table and open the analysis cache if there is one.
+    The server created the cache file before starting the pool, so workers never create or resize it.
+    """
+    ChessAI.attachSharedTable(table_name)
+    if analysis_cache_path:
+        import ChessAnalysisCache  # only loaded when a cache is used
+        ChessAI.analysis_cache = ChessAnalysisCache.AnalysisCache(analysis_cache_path, analysis_cache_mb,
+                                                                  create=False)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class GameSession:
+    """
+    One game: its position, the human's color and the engine's remaining time budget.
+    """
+
+    def __init__(self, game_id, human_color, time_budget):
+        self.game_id = game_id
+        self.game_state = ChessEngine.GameState()
+        self.human_color = human_color
+        self.time_left = time_budget
+        self.valid_moves = self.game_state.getValidMoves()
+
+    def engineToMove(self):
+        return (self.game_state.white_to_move and self.human_color == "b") or (
+                not self.game_state.white_to_move and self.human_color == "w")
+
+    def moveTime(self):
+        """
+        Seconds for the next engine move out of the remaining budget.
+        """
+        return max(MIN_MOVE_TIME, min(self.time_left / MOVES_TO_GO, MAX_MOVE_TIME))
+
+    def status(self):
+        if self.game_state.checkmate:
+            return "checkmate"
+        if self.game_state.stalemate:
+            return "stalemate"
+        return "ongoing"
+
+    def makeMove(self, move):
+        self.game_state.makeMove(move)
+        self.valid_moves = self.game_state.getValidMoves()
+
+    def undoMove(self):
+        self.game_state.undoMove()
+        self.valid_moves = self.game_state.getValidMoves()
+
+
+class GameServer:
+    """
+    Holds the game sessions, the search queue and the process pool.
+    """
+
+    def __init__(self, workers=WORKERS, max_depth=ChessAI.MAX_DEPTH, hash_mb=ChessAI.HASH_SIZE_MB,
+                 analysis_cache_path=None, analysis_cache_mb=64):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.hash_mb = hash_mb
+        self.analysis_cache_path = analysis_cache_path
+        self.analysis_cache_mb = analysis_cache_mb
+        self.transposition_table = None
+        self.games = {}
+        self.game_ids = itertools.count(1)
+        self.search_queue = asyncio.Queue()
+        self.executor = None
+        self.dispatchers = []
+        self.wait_latencies = collections.deque(maxlen=LATENCY_SAMPLES)  # queued until a worker picked it up
+        self.search_latencies = collections.deque(maxlen=LATENCY_SAMPLES)  # queued until the move was back
+        self.counters = {"searches": 0, "nodes": 0, "games_started": 0, "moves": 0}
+
+    async def start(self, host=HOST, port=PORT):
+        if self.analysis_cache_path:
+            import ChessAnalysisCache
+            ChessAnalysisCache.createCacheFile(self.analysis_cache_path, self.analysis_cache_mb)
+        self.transposition_table = ChessAI.SharedTranspositionTable(self.hash_mb)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initWorker,
+                                            initargs=(self.transposition_table.name, self.analysis_cache_path,
+                                                      self.analysis_cache_mb))
+        self.dispatchers = [asyncio.ensure_future(self.dispatch()) for _ in range(self.workers)]
+        return await asyncio.start_server(self.handleClient, host, port)
+
+    async def stop(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.transposition_table.close()
+
+    async def dispatch(self):
+        """
+        Feed one pool worker: take the oldest queued search, run it, resolve its future.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            session, queued_time, future = await self.search_queue.get()
+            self.wait_latencies.append(time.time() - queued_time)
+            move_time = session.moveTime()
+            try:
+                result = await loop.run_in_executor(self.executor, searchWorker, session.game_state.packPosition(),
+                                                    move_time, self.max_depth)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+                continue
+            finally:
+                self.search_queue.task_done()
+            self.search_latencies.append(time.time() - queued_time)
+            self.counters["searches"] += 1
+            self.counters["nodes"] += result[2]
+            session.time_left = max(session.time_left - result[3], 0)
+            if not future.done():
+                future.set_result(result)
+
+    async def engineMove(self, session):
+        """
+        Queue a search for the session and play the move it returns.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.search_queue.put((session, time.time(), future))
+        uci_move, score, nodes, seconds = await future
+        move = ChessUCI.parseUciMove(session.game_state, uci_move, session.valid_moves) if uci_move else None
+        if move is None:
+            move = ChessAI.findRandomMove(session.valid_moves)
+        session.makeMove(move)
+        self.counters["moves"] += 1
+        return move.getUciNotation()
+
+    def metrics(self):
+        return {"queue_depth": self.search_queue.qsize(),
+                "active_games": len(self.games),
+                "workers": self.workers,
+                "wait_p50": percentile(self.wait_latencies, 0.5),
+                "wait_p99": percentile(self.wait_latencies, 0.99),
+                "latency_p50": percentile(self.search_latencies, 0.5),
+                "latency_p90": percentile(self.search_latencies, 0.9),
+                "latency_p99": percentile(self.search_latencies, 0.99),
+                **self.counters}
+
+    async def handleRequest(self, request):
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "request must be a JSON object"}
+        command = request.get("cmd")
+        if command == "new":
+            color = request.get("color", "w")
+            if color not in ("w", "b"):
+                return {"ok": False, "error": "color must be w or b"}
+            session = GameSession(next(self.game_ids), color, float(request.get("time", GAME_TIME)))
+            self.games[session.game_id] = session
+            self.counters["games_started"] += 1
+            reply = {"ok": True, "game": session.game_id}
+            if session.engineToMove():
+                try:
+                    reply["engine_move"] = await self.engineMove(session)
+                except Exception as error:  # a broken pool or an error in the search worker
+                    del self.games[session.game_id]
+                    return {"ok": False, "error": "search failed: " + str(error)}
+            reply["fen"] = session.game_state.getFen()
+            reply["status"] = session.status()
+            return reply
+        if command == "move":
+            session = self.games.get(request.get("game"))
+            if session is None:
+                return {"ok": False, "error": "unknown game"}
+            if session.status() != "ongoing" or session.engineToMove():
+                return {"ok": False, "error": "not your move"}
+            move = ChessUCI.parseUciMove(session.game_state, str(request.get("move")), session.valid_moves)
+            if move is None:
+                return {"ok": False, "error": "illegal move"}
+            session.makeMove(move)
+            self.counters["moves"] += 1
+            reply = {"ok": True, "game": session.game_id}
+            if session.status() == "ongoing":
+                try:
+                    reply["engine_move"] = await self.engineMove(session)
+                except Exception as error:
+                    session.undoMove()  # the human can send the move again
+                    self.counters["moves"] -= 1
+                    return {"ok": False, "error": "search failed: " + str(error)}
+            reply["fen"] = session.game_state.getFen()
+            reply["status"] = session.status()
+            return reply
+        if command == "close":
+            self.games.pop(request.get("game"), None)
+            return {"ok": True}
+        if command == "metrics":
+            return {"ok": True, "metrics": self.metrics()}
+        return {"ok": False, "error": "unknown command"}
+
+    async def handleClient(self, reader, writer):
+        """
+        Serve one connection, requests on a connection are answered in order.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    reply = await self.handleRequest(request)
+                except (ValueError, TypeError) as error:
+                    reply = {"ok": False, "error": str(error)}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port, workers, max_depth, hash_mb, analysis_cache_path, analysis_cache_mb):
+    game_server = GameServer(workers, max_depth, hash_mb, analysis_cache_path, analysis_cache_mb)
+    server = await game_server.start(host, port)
+    print("Serving on", host, port, "with", workers, "workers")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await game_server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many human vs engine games over TCP.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--depth", type=int, default=ChessAI.MAX_DEPTH, help="maximum search depth")
+    parser.add_argument("--hash", type=int, default=ChessAI.HASH_SIZE_MB, help="shared transposition table in MB")
+    parser.add_argument("--analysis-cache", help="file that keeps finished searches between runs")
+    parser.add_argument("--analysis-cache-mb", type=int, default=64, help="size of a new analysis cache file")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers, args.depth, args.hash, args.analysis_cache,
+                      args.analysis_cache_mb))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+UCI protocol front-end.
+Reads commands from stdin and answers on stdout, so the engine can run on headless servers
+and under standard chess GUIs, tournament managers and analysis tools.
+Only ChessEngine and ChessAI are used, pygame is never imported.
+"""
+import sys
+import threading
+import time
+import ChessEngine
+import ChessAI
+
+ENGINE_NAME = "chessEngine"
+ENGINE_AUTHOR = "alexlee78980"
+MOVE_OVERHEAD = 0.05  # seconds kept back for communication delays when playing on a clock
+DEFAULT_MOVES_TO_GO = 30  # moves the remaining time is split over when the GUI doesn't say
+
+
+def parseUciMove(game_state, text, valid_moves=None):
+    """
+    Find the legal move written in UCI notation (e.g. e2e4, e7e8q), returns None if there is none.
+    """
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    for move in valid_moves:
+        if move.getUciNotation() == text:
+            return move
+    if len(text) == 4:
+        # a promotion written without its piece makes a queen
+        for move in valid_moves:
+            if move.is_pawn_promotion and move.promotion_piece == "Q" and move.getUciNotation()[:4] == text:
+                return move
+    return None
+
+
+def formatScore(score):
+    """
+    UCI score of a ChessAI score, centipawns or moves to mate.
+    """
+    if ChessAI.isMateScore(score):
+        plies = ChessAI.CHECKMATE - abs(score)
+        moves = (plies + 1) // 2
+        return "mate " + str(moves if score > 0 else -moves)
+    return "cp " + str(int(round(score * 100)))
+
+
+class UciEngine:
+    """
+    State of one UCI session: the current position, the options and the background search thread.
+    """
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.game_state = ChessEngine.GameState()
+        self.options = {"Hash": ChessAI.HASH_SIZE_MB, "Threads": 1, "Ponder": False, "MultiPV": 1,
+                        "BookFile": "", "AnalysisFile": ""}
+        self.book = None
+        self.parallel_search = None  # ChessAI.ParallelSearch when Threads is more than 1
+        self.search_thread = None
+        self.stop_event = threading.Event()
+        self.infinite = False
+        self.pondering = False
+        self.ponder_time_limit = None
+        self.last_pv = []
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, input=sys.stdin):
+        """
+        Handle commands until quit or the end of input.
+        """
+        for line in input:
+            if not self.handleCommand(line):
+                break
+        self.stopSearch()
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+        if ChessAI.analysis_cache is not None:
+            ChessAI.analysis_cache.close()
+
+    def handleCommand(self, line):
+        """
+        Handle one command line, returns False when the engine should quit.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default " + str(ChessAI.HASH_SIZE_MB) + " min 1 max 4096")
+            self.send("option name Threads type spin default 1 min 1 max 64")
+            self.send("option name Ponder type check default false")
+            self.send("option name MultiPV type spin default 1 min 1 max 64")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name AnalysisFile type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.setOption(tokens[1:])
+        elif command == "ucinewgame":
+            self.stopSearch()
+            ChessAI.transposition_table.clear()
+            if self.parallel_search is not None:
+                self.parallel_search.clear()
+            self.game_state = ChessEngine.GameState()
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(tokens[1:])
+        elif command == "go":
+            self.stopSearch()
+            self.go(tokens[1:])
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "quit":
+            return False
+        elif command == "d":
+            self.send(self.game_state.getFen())
+        return True
+
+    def setOption(self, tokens):
+        """
+        setoption name <name> [value <value>]
+        """
+        if "name" not in tokens:
+            return
+        value_index = tokens.index("value") if "value" in tokens else len(tokens)
+        name = " ".join(tokens[tokens.index("name") + 1:value_index])
+        value = " ".join(tokens[value_index + 1:])
+        if name in ("Hash", "Threads", "MultiPV"):
+            try:
+                number = max(1, int(value))
+            except ValueError:
+                self.send("info string invalid value " + value + " for option " + name)
+                return
+        if name == "Hash":
+            self.stopSearch()
+            self.options["Hash"] = number
+            ChessAI.transposition_table.resize(number)
+            self.setThreads(self.options["Threads"])
+        elif name == "Threads":
+            self.stopSearch()
+            self.setThreads(number)
+        elif name == "Ponder":
+            self.options["Ponder"] = value.lower() == "true"
+        elif name == "MultiPV":
+            self.options["MultiPV"] = number
+        elif name == "BookFile":
+            self.setBook(value)
+        elif name == "AnalysisFile":
+            self.stopSearch()
+            self.setAnalysisCache(value)
+
+    def setThreads(self, threads):
+        """
+        Search with threads processes sharing a transposition table of the Hash size, one is the plain search.
+        """
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+            self.parallel_search = None
+        self.options["Threads"] = threads
+        if threads > 1:
+            self.parallel_search = ChessAI.ParallelSearch(threads, self.options["Hash"])
+
+    def setBook(self, path):
+        """
+        Open the opening book at path, an empty path or <empty> turns the book off.
+        """
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        self.options["BookFile"] = path
+        if path and path != "<empty>":
+            import ChessBook  # only loaded when a book is used
+            try:
+                self.book = ChessBook.OpeningBook(path)
+            except (OSError, ValueError) as error:
+                self.send("info string cannot open book " + path + ": " + str(error))
+
+    def setAnalysisCache(self, path):
+        """
+        Keep finished searches in the analysis cache file at path, an empty path or <empty> turns it off.
+        """
+        if ChessAI.analysis_cache is not None:
+            ChessAI.analysis_cache.close()
+            ChessAI.analysis_cache = None
+        self.options["AnalysisFile"] = path
+        if path and path != "<empty>":
+            import ChessAnalysisCache  # only loaded when a cache is used
+            cache = ChessAnalysisCache.AnalysisCache(path)
+            try:
+                cache.open()
+            except (OSError, ValueError) as error:
+                self.send("info string cannot open analysis file " + path + ": " + str(error))
+                return
+            ChessAI.analysis_cache = cache
+
+    def setPosition(self, tokens):
+        """
+        position [startpos | fen <fen>] [moves <move1> ... <movei>]
+        """
+        moves_index = tokens.index("moves") if "moves" in tokens else len(tokens)
+        game_state = ChessEngine.GameState()
+        if tokens and tokens[0] == "fen":
+            try:
+                game_state.loadFen(" ".join(tokens[1:moves_index]))
+            except ValueError as error:
+                self.send("info string " + str(error))
+                return  # the position is left as it was
+        for text in tokens[moves_index + 1:]:
+            move = parseUciMove(game_state, text)
+            if move is None:
+                self.send("info string illegal move " + text)
+                break
+            game_state.makeMove(move)
+        self.game_state = game_state
+
+    def go(self, tokens):
+        """
+        go [depth N] [movetime MS] [wtime MS] [btime MS] [winc MS] [binc MS] [movestogo N] [nodes N] [mate N]
+           [searchmoves <move1> ... <movei>] [infinite] [ponder]
+        """
+        limits = {}
+        search_moves = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes", "mate"):
+                if i + 1 < len(tokens):
+                    try:
+                        limits[token] = int(tokens[i + 1])
+                    except ValueError:
+                        self.send("info string invalid value " + tokens[i + 1] + " for " + token)
+                        return
+                i += 2
+                continue
+            if token == "searchmoves":
+                i += 1
+                while i < len(tokens) and tokens[i] not in ("depth", "movetime", "wtime", "btime", "winc", "binc",
+                                                            "movestogo", "nodes", "mate", "infinite", "ponder"):
+                    search_moves.append(tokens[i])
+                    i += 1
+                continue
+            limits[token] = True
+            i += 1
+
+        valid_moves = self.game_state.getValidMoves()
+        if search_moves:
+            valid_moves = [move for move in valid_moves if move.getUciNotation() in search_moves] or valid_moves
+
+        if self.book is not None and "infinite" not in limits and "ponder" not in limits:
+            book_move = self.book.pickMove(self.game_state, valid_moves)
+            if book_move is not None:
+                self.send("info string book move")
+                self.send("bestmove " + book_move.getUciNotation())
+                return
+
+        max_depth = ChessAI.MAX_DEPTH
+        if "depth" in limits:
+            max_depth = limits["depth"]
+        elif "mate" in limits:
+            max_depth = 2 * limits["mate"] - 1
+        time_limit = self.timeLimit(limits)
+
+        self.infinite = "infinite" in limits
+        self.pondering = "ponder" in limits
+        self.ponder_time_limit = time_limit
+        if self.pondering:
+            time_limit = None  # the clock starts on ponderhit
+        self.last_pv = []
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(target=self.search,
+                                              args=(valid_moves, max_depth, time_limit, limits.get("nodes")))
+        self.search_thread.daemon = True
+        self.search_thread.start()
+
+    def timeLimit(self, limits):
+        """
+        Seconds to spend on this move, None to search until depth, nodes or stop.
+        """
+        if "movetime" in limits:
+            return max(limits["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+        time_left = limits.get("wtime" if self.game_state.white_to_move else "btime")
+        if time_left is None:
+            return None
+        increment = limits.get("winc" if self.game_state.white_to_move else "binc", 0)
+        moves_to_go = limits.get("movestogo", DEFAULT_MOVES_TO_GO)
+        time_limit = time_left / 1000 / max(moves_to_go, 1) + increment / 1000 * 0.75
+        return max(min(time_limit, time_left / 1000 - MOVE_OVERHEAD), 0.01)
+
+    def search(self, valid_moves, max_depth, time_limit, max_nodes):
+        """
+        Runs on the search thread, reports info lines and finally the best move.
+        """
+        if self.options["MultiPV"] > 1:
+            lines = ChessAI.searchMultiPV(self.game_state, self.options["MultiPV"], valid_moves, max_depth=max_depth,
+                                          time_limit=time_limit, max_nodes=max_nodes, stop_event=self.stop_event,
+                                          info_callback=self.sendInfo)
+            best_move = lines[0][0] if lines else None
+        else:
+            search = self.parallel_search.search if self.parallel_search is not None else ChessAI.searchPosition
+            best_move, score = search(self.game_state, valid_moves, max_depth=max_depth, time_limit=time_limit,
+                                      max_nodes=max_nodes, stop_event=self.stop_event, info_callback=self.sendInfo)
+        # in infinite and ponder mode bestmove may only be sent after stop or ponderhit
+        while (self.infinite or self.pondering) and not self.stop_event.is_set():
+            self.stop_event.wait(0.01)
+        if best_move is None:
+            self.send("bestmove 0000")
+            return
+        line = "bestmove " + best_move.getUciNotation()
+        pv = self.last_pv if self.last_pv and self.last_pv[0] == best_move else []
+        if len(pv) > 1:
+            line += " ponder " + pv[1].getUciNotation()
+        self.send(line)
+
+    def sendInfo(self, info):
+        if info["type"] == "best_move":
+            if self.options["MultiPV"] == 1:  # multipv lines are only sent for whole iterations
+                self.send("info depth " + str(info["depth"]) + " score " + formatScore(info["score"]) + " nodes " +
+                          str(info["nodes"]) + " time " + str(int(info["time"] * 1000)) + " pv " +
+                          info["pv"][0].getUciNotation())
+            return
+        self.last_pv = info["pv"]
+        lines = info.get("lines", [(None, info["score"], info["pv"])])
+        for rank, (move, score, pv) in enumerate(lines, 1):
+            self.send("info depth " + str(info["depth"]) + (" multipv " + str(rank) if "lines" in info else "") +
+                      " score " + formatScore(score) + " nodes " + str(info["nodes"]) + " nps " + str(info["nps"]) +
+                      " time " + str(int(info["time"] * 1000)) + " pv " +
+                      " ".join(move.getUciNotation() for move in pv))
+
+    def ponderHit(self):
+        """
+        The opponent played the expected move, keep searching but now on our own clock.
+        """
+        if self.pondering:
+            if self.ponder_time_limit is not None:
+                ChessAI.search_limits["deadline"] = time.time() + self.ponder_time_limit
+            self.pondering = False
+
+    def stopSearch(self):
+        """
+        Stop a running search and wait for it to send its best move.
+        """
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+        self.infinite = False
+        self.pondering = False
+
+
+def main():
+    UciEngine().run()
+
+
+if __name__ == "__main__":
+    main()